@@ -0,0 +1,2 @@
+Static deltas are now generated in a worker thread, so the sync and import pipelines keep going
+while a delta is being computed.
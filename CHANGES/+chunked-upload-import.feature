@@ -0,0 +1,4 @@
+The import endpoints now accept a chunked upload in place of an artifact. The chunks are read in
+order as a single stream, progress is reported per chunk, and the tarball is no longer opened
+while serving the API request. With `wait_for_chunks` enabled, the import starts before the upload
+is complete and processes every chunk as soon as it is uploaded.
@@ -0,0 +1,2 @@
+Sped up syncing by fetching dirtree objects concurrently, level by level, while respecting the
+remote's download concurrency.
@@ -0,0 +1 @@
+Objects shared by multiple commits or refs are now processed only once during sync and import.
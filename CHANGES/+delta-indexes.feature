@@ -0,0 +1,2 @@
+Delta indexes (`delta-indexes/`) are published along with computed static deltas, so clients
+can discover available deltas without probing for their superblocks.
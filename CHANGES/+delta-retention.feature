@@ -0,0 +1,2 @@
+Added the `delta_retention` repository field. When set, static deltas that do not target any of the
+last K commits of a ref are removed from new repository versions.
@@ -0,0 +1 @@
+Commits in a ref's history are now traversed only where their trees differ from their parents'.
@@ -0,0 +1,2 @@
+Immediate syncs now turn the pulled OSTree objects into artifacts directly instead of downloading
+every object for the second time.
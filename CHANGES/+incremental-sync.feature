@@ -0,0 +1,2 @@
+Syncs now stop walking a ref's history at the first commit that is already present in the
+repository, so unchanged history is neither downloaded nor traversed again.
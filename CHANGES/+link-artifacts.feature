@@ -0,0 +1,2 @@
+Artifacts are now created from hard links (or reflinks) to files in the local OSTree repository
+instead of copies, falling back to copying only when linking is not possible.
@@ -0,0 +1,2 @@
+On-demand syncs no longer pull the whole remote repository into the worker's scratch space; only
+refs, commits, and dirtrees are fetched.
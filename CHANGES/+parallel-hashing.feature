@@ -0,0 +1,2 @@
+Objects extracted from imported tarballs are now hashed by a pool of threads while the tarball is
+extracted and parsed. The size of the pool can be limited by the `OSTREE_HASHING_WORKERS` setting.
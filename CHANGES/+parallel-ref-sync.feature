@@ -0,0 +1,2 @@
+Refs are now processed concurrently during a sync. The number of refs processed at once can be
+limited with the `OSTREE_SYNC_REF_CONCURRENCY` setting (defaults to 4).
@@ -0,0 +1,3 @@
+Static deltas of all synced or imported refs are generated concurrently by up to
+`OSTREE_STATIC_DELTA_WORKERS` (4 by default) workers. On-demand syncs fetch the history needed
+for the deltas of all updated refs at once.
@@ -0,0 +1,2 @@
+Static deltas already computed for the same pair of commits within a domain are now reused instead
+of being generated again.
@@ -0,0 +1,2 @@
+Syncs now finish right away when the remote summary and the sync options have not changed since the
+last sync.
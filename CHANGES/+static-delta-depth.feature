@@ -0,0 +1,2 @@
+Added the `delta_depth` and `compute_delta_from_scratch` repository fields. They control how many
+parent commits static deltas are generated from and whether a delta from scratch is generated too.
@@ -0,0 +1,3 @@
+Static deltas are now stored as dedicated content units. Each unit records the commits it is
+computed between, the number of parts, and the total size. They are listed at the new
+`content/ostree/deltas/` endpoint.
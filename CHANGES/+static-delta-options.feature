@@ -0,0 +1,3 @@
+Added repository fields for tuning the generation of static deltas: `delta_compression`,
+`delta_min_fallback_size`, `delta_max_chunk_size`, `delta_max_bsdiff_size`, and
+`delta_bsdiff_enabled`.
@@ -0,0 +1 @@
+Static delta files are no longer copied and hashed multiple times before being saved.
@@ -0,0 +1,2 @@
+Objects referenced by a commit are now enumerated while walking its directory trees instead of
+being collected in memory first.
@@ -0,0 +1,2 @@
+Imported tarballs are now read as a stream in a single pass. Objects are hashed while being
+extracted and are stored only once in the worker's working directory.
@@ -0,0 +1,3 @@
+The summary of an imported repository is now built from the refs and static deltas stored in the
+database, without copying heads of already uploaded refs from the storage. Timestamps and versions
+of commits are stored in the database and listed in the summary for all refs.
@@ -0,0 +1,3 @@
+Added the `trust_checksums` option to the import endpoints. When it is enabled, artifacts of
+objects already stored in Pulp are reused based on the objects' checksums instead of hashing the
+imported objects again.
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.16 on 2026-10-16 09:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ostree', '0008_add_domain_support'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='ostreerepository',
+            name='last_sync_details',
+            field=models.JSONField(default=dict),
+        ),
+    ]
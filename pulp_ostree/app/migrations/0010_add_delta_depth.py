@@ -0,0 +1,23 @@
+# Generated by Django 4.2.16 on 2026-10-16 11:27
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ostree', '0009_add_last_sync_details'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='ostreerepository',
+            name='delta_depth',
+            field=models.PositiveIntegerField(default=1),
+        ),
+        migrations.AddField(
+            model_name='ostreerepository',
+            name='compute_delta_from_scratch',
+            field=models.BooleanField(default=False),
+        ),
+    ]
@@ -0,0 +1,38 @@
+# Generated by Django 4.2.16 on 2026-10-16 12:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ostree', '0010_add_delta_depth'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='ostreerepository',
+            name='delta_compression',
+            field=models.CharField(blank=True, choices=[('lzma', 'Lzma'), ('none', 'None')], max_length=8, null=True),
+        ),
+        migrations.AddField(
+            model_name='ostreerepository',
+            name='delta_min_fallback_size',
+            field=models.PositiveIntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='ostreerepository',
+            name='delta_max_chunk_size',
+            field=models.PositiveIntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='ostreerepository',
+            name='delta_max_bsdiff_size',
+            field=models.PositiveIntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='ostreerepository',
+            name='delta_bsdiff_enabled',
+            field=models.BooleanField(blank=True, null=True),
+        ),
+    ]
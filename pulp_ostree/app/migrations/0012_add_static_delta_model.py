@@ -0,0 +1,34 @@
+# Generated by Django 4.2.16 on 2026-10-16 13:48
+
+from django.db import migrations, models
+import django.db.models.deletion
+import pulpcore.app.util
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ostree', '0011_add_static_delta_options'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OstreeStaticDelta',
+            fields=[
+                ('content_ptr', models.OneToOneField(auto_created=True, on_delete=django.db.models.deletion.CASCADE, parent_link=True, primary_key=True, related_name='ostree_ostreestaticdelta', serialize=False, to='core.content')),
+                ('from_checksum', models.CharField(max_length=64, null=True)),
+                ('to_checksum', models.CharField(max_length=64)),
+                ('relative_path', models.TextField()),
+                ('digest', models.CharField(max_length=64)),
+                ('parts', models.PositiveIntegerField()),
+                ('size', models.BigIntegerField()),
+                ('_pulp_domain', models.ForeignKey(default=pulpcore.app.util.get_domain_pk, on_delete=django.db.models.deletion.PROTECT, to='core.domain')),
+            ],
+            options={
+                'default_related_name': '%(app_label)s_%(model_name)s',
+                'indexes': [models.Index(fields=['to_checksum', 'from_checksum', '_pulp_domain'], name='ostree_delta_commits_idx')],
+                'unique_together': {('relative_path', 'digest', '_pulp_domain')},
+            },
+            bases=('core.content',),
+        ),
+    ]
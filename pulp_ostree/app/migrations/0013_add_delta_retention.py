@@ -0,0 +1,18 @@
+# Generated by Django 4.2.16 on 2026-10-16 14:36
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ostree', '0012_add_static_delta_model'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='ostreerepository',
+            name='delta_retention',
+            field=models.PositiveIntegerField(blank=True, null=True),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 4.2.16 on 2026-10-16 23:41
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ostree', '0013_add_delta_retention'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='ostreecommit',
+            name='timestamp',
+            field=models.BigIntegerField(null=True),
+        ),
+        migrations.AddField(
+            model_name='ostreecommit',
+            name='version',
+            field=models.TextField(null=True),
+        ),
+    ]
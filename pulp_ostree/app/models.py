@@ -13,6 +13,8 @@ from pulpcore.plugin.models import (
 from pulpcore.plugin.repo_version_utils import remove_duplicates, validate_duplicate_content
 from pulpcore.plugin.util import get_domain_pk
 
+from pulp_ostree.app.utils import get_delta_index_path
+
 logger = getLogger(__name__)
 
 
@@ -28,6 +30,13 @@ class OstreeObjectType(models.IntegerChoices):
     OSTREE_OBJECT_TYPE_PAYLOAD_LINK = 7
 
 
+class DeltaCompression(models.TextChoices):
+    """An enum of compression algorithms supported for static deltas."""
+
+    LZMA = "lzma"
+    NONE = "none"
+
+
 class OstreeObject(Content):
     """A content model for a regular OSTree object (e.g., dirtree, dirmeta, file)."""
 
@@ -53,6 +62,8 @@ class OstreeCommit(Content):
     checksum = models.CharField(max_length=64, db_index=True)
     relative_path = models.TextField(null=False)
     objs = models.ManyToManyField(OstreeObject, through="OstreeCommitObject")
+    timestamp = models.BigIntegerField(null=True)
+    version = models.TextField(null=True)
 
     class Meta:
         default_related_name = "%(app_label)s_%(model_name)s"
@@ -101,6 +112,36 @@ class OstreeContent(Content):
         unique_together = ("relative_path", "digest", "_pulp_domain")
 
 
+class OstreeStaticDelta(Content):
+    """A content model for an OSTree static delta consisting of a superblock and its parts."""
+
+    TYPE = "delta"
+    repo_key_fields = ("relative_path",)
+
+    _pulp_domain = models.ForeignKey("core.Domain", default=get_domain_pk, on_delete=models.PROTECT)
+    from_checksum = models.CharField(max_length=64, null=True)
+    to_checksum = models.CharField(max_length=64)
+    relative_path = models.TextField(null=False)
+    digest = models.CharField(max_length=64)
+    parts = models.PositiveIntegerField()
+    size = models.BigIntegerField()
+
+    class Meta:
+        default_related_name = "%(app_label)s_%(model_name)s"
+        unique_together = [["relative_path", "digest", "_pulp_domain"]]
+        indexes = [
+            models.Index(
+                fields=["to_checksum", "from_checksum", "_pulp_domain"],
+                name="ostree_delta_commits_idx",
+            )
+        ]
+
+    @property
+    def index_relative_path(self):
+        """Return the relative path to the delta index of the commit the delta targets."""
+        return get_delta_index_path(self.to_checksum)
+
+
 class OstreeConfig(Content):
     """A content model for an OSTree repository configuration file."""
 
@@ -159,10 +200,22 @@ class OstreeRepository(Repository, AutoAddObjPermsMixin):
         OstreeConfig,
         OstreeSummary,
         OstreeContent,
+        OstreeStaticDelta,
     ]
     REMOTE_TYPES = [OstreeRemote]
 
     compute_delta = models.BooleanField(default=True)
+    delta_depth = models.PositiveIntegerField(default=1)
+    compute_delta_from_scratch = models.BooleanField(default=False)
+    delta_compression = models.CharField(
+        max_length=8, choices=DeltaCompression.choices, null=True, blank=True
+    )
+    delta_min_fallback_size = models.PositiveIntegerField(null=True, blank=True)
+    delta_max_chunk_size = models.PositiveIntegerField(null=True, blank=True)
+    delta_max_bsdiff_size = models.PositiveIntegerField(null=True, blank=True)
+    delta_bsdiff_enabled = models.BooleanField(null=True, blank=True)
+    delta_retention = models.PositiveIntegerField(null=True, blank=True)
+    last_sync_details = models.JSONField(default=dict)
 
     class Meta:
         default_related_name = "%(app_label)s_%(model_name)s"
@@ -175,10 +228,45 @@ class OstreeRepository(Repository, AutoAddObjPermsMixin):
         ]
 
     def finalize_new_version(self, new_version):
-        """Handle repository duplicates."""
+        """Handle repository duplicates and remove stale static deltas."""
         remove_duplicates(new_version)
+        if self.delta_retention is not None:
+            self.remove_stale_static_deltas(new_version)
         validate_duplicate_content(new_version)
 
+    def remove_stale_static_deltas(self, new_version):
+        """Remove static deltas not targeting any of the last ``delta_retention`` heads of refs.
+
+        Delta indexes of the commits the removed deltas target are removed as well.
+        """
+        commits = {
+            commit.pk: commit
+            for commit in new_version.get_content(OstreeCommit.objects).only(
+                "checksum", "parent_commit"
+            )
+        }
+
+        retained_checksums = set()
+        for ref in new_version.get_content(OstreeRef.objects).only("commit"):
+            commit = commits.get(ref.commit_id)
+            for _ in range(self.delta_retention):
+                if commit is None:
+                    break
+                retained_checksums.add(commit.checksum)
+                commit = commits.get(commit.parent_commit_id)
+
+        stale_deltas = new_version.get_content(OstreeStaticDelta.objects).exclude(
+            to_checksum__in=retained_checksums
+        )
+        stale_delta_indexes = new_version.get_content(OstreeContent.objects).filter(
+            relative_path__in={
+                static_delta.index_relative_path
+                for static_delta in stale_deltas.only("to_checksum")
+            }
+        )
+        new_version.remove_content(stale_deltas)
+        new_version.remove_content(stale_delta_indexes)
+
 
 class OstreeDistribution(Distribution, AutoAddObjPermsMixin):
     """A distribution model for OSTree content."""
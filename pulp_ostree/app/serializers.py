@@ -1,11 +1,9 @@
-import tarfile
 from gettext import gettext as _
 
 from rest_framework import serializers
 
 from pulpcore.plugin import serializers as platform
-from pulpcore.plugin.models import Artifact, Remote
-from pulpcore.plugin.viewsets import NamedModelViewSet
+from pulpcore.plugin.models import Artifact, Remote, Upload
 
 from . import models
 
@@ -18,33 +16,81 @@ class OstreeImportAllSerializer(serializers.Serializer):
         lookup_field="pk",
         view_name="artifacts-detail",
         queryset=Artifact.objects.all(),
+        required=False,
         help_text=_("An artifact representing OSTree content compressed as a tarball."),
     )
+    upload = platform.RelatedField(
+        many=False,
+        lookup_field="pk",
+        view_name="uploads-detail",
+        queryset=Upload.objects.all(),
+        required=False,
+        help_text=_(
+            "A chunked upload of OSTree content compressed as a tarball. The chunks are read "
+            "in order without assembling the tarball first. The upload is deleted once the "
+            "content is imported."
+        ),
+    )
     repository_name = serializers.CharField(
         help_text=_("The name of a repository that contains the compressed OSTree content.")
     )
+    trust_checksums = serializers.BooleanField(
+        default=False,
+        help_text=_(
+            "Trust that the objects in the tarball match the checksums encoded in their paths. "
+            "Objects already stored in Pulp are then not hashed again, and their artifacts are "
+            "reused."
+        ),
+    )
+    wait_for_chunks = serializers.BooleanField(
+        default=False,
+        help_text=_(
+            "Start importing the upload before all of its chunks are uploaded. The chunks are "
+            "read in order as soon as they arrive; the upload is finished once its chunks cover "
+            "all of its bytes. The import fails if the next chunk does not arrive within "
+            "OSTREE_UPLOAD_CHUNK_TIMEOUT seconds."
+        ),
+    )
 
     def validate(self, data):
-        """Validate the passed tarball and optional ref attributes."""
-        new_data = {}
-        new_data.update(self.initial_data)
-
-        self.validate_tarball(new_data)
-
-        return new_data
-
-    def validate_tarball(self, data):
-        """Check if the artifact is a tarball."""
-        artifact = NamedModelViewSet.get_resource(data["artifact"])
-
-        try:
-            t = tarfile.open(fileobj=artifact.file)
-        except tarfile.TarError:
-            raise serializers.ValidationError(_("The artifact is not a tar archive file"))
-        else:
-            t.close()
-
-        data["artifact"] = artifact
+        """Validate that exactly one source of the tarball was passed.
+
+        The tarball itself is not opened here, so the request does not wait for reading large
+        files; an invalid tarball makes the import task fail. An upload must be complete unless
+        the import waits for its chunks.
+        """
+        if ("artifact" in data) == ("upload" in data):
+            raise serializers.ValidationError(
+                _("Exactly one of 'artifact' or 'upload' must be specified.")
+            )
+
+        if data["wait_for_chunks"]:
+            if "upload" not in data:
+                raise serializers.ValidationError(
+                    {"wait_for_chunks": _("Waiting for chunks requires an upload.")}
+                )
+        elif "upload" in data:
+            self.validate_upload_complete(data["upload"])
+
+        return data
+
+    @staticmethod
+    def validate_upload_complete(upload):
+        """Validate that the chunks of the upload follow each other and cover the whole file."""
+        offset = 0
+        for chunk in upload.chunks.order_by("offset"):
+            if chunk.offset != offset:
+                break
+            offset += chunk.size
+
+        if offset != upload.size:
+            raise serializers.ValidationError(
+                {
+                    "upload": _(
+                        "The upload is incomplete; its chunks do not cover all of its {} bytes."
+                    ).format(upload.size)
+                }
+            )
 
 
 class OstreeImportCommitsToRefSerializer(OstreeImportAllSerializer):
@@ -134,6 +180,35 @@ class OstreeContentSerializer(platform.SingleArtifactContentSerializer):
         model = models.OstreeContent
 
 
+class OstreeStaticDeltaSerializer(platform.MultipleArtifactContentSerializer):
+    """A Serializer class for OSTree static deltas."""
+
+    from_checksum = serializers.CharField(
+        allow_null=True,
+        help_text=_("The checksum of a commit the delta is computed from; null for from-scratch."),
+    )
+    to_checksum = serializers.CharField(
+        help_text=_("The checksum of a commit the delta is computed to."),
+    )
+    relative_path = serializers.CharField(
+        help_text=_("The relative path to a directory containing the superblock and parts."),
+    )
+    digest = serializers.CharField(help_text=_("The sha256 digest of the superblock."))
+    parts = serializers.IntegerField(help_text=_("The number of parts stored separately."))
+    size = serializers.IntegerField(help_text=_("The total size of all files in bytes."))
+
+    class Meta:
+        fields = platform.MultipleArtifactContentSerializer.Meta.fields + (
+            "from_checksum",
+            "to_checksum",
+            "relative_path",
+            "digest",
+            "parts",
+            "size",
+        )
+        model = models.OstreeStaticDelta
+
+
 class OstreeConfigSerializer(platform.SingleArtifactContentSerializer):
     """A Serializer class for OSTree repository configuration files."""
 
@@ -198,9 +273,81 @@ class OstreeRepositorySerializer(platform.RepositorySerializer):
     """A Serializer class for an OSTree repository."""
 
     compute_delta = serializers.BooleanField(default=True)
+    delta_depth = serializers.IntegerField(
+        default=1,
+        min_value=0,
+        required=False,
+        help_text=_(
+            "The number of parent commits of a ref's head to compute static deltas from when "
+            "'compute_delta' is enabled."
+        ),
+    )
+    compute_delta_from_scratch = serializers.BooleanField(
+        default=False,
+        required=False,
+        help_text=_(
+            "An option to additionally compute a static delta from scratch to the head of each ref "
+            "when 'compute_delta' is enabled."
+        ),
+    )
+
+    delta_compression = serializers.ChoiceField(
+        choices=models.DeltaCompression.choices,
+        allow_null=True,
+        required=False,
+        help_text=_("The compression of static deltas. Defaults to lzma."),
+    )
+    delta_min_fallback_size = serializers.IntegerField(
+        min_value=0,
+        allow_null=True,
+        required=False,
+        help_text=_(
+            "The minimal size of objects, in megabytes, that are never part of static deltas; "
+            "clients fetch these objects individually."
+        ),
+    )
+    delta_max_chunk_size = serializers.IntegerField(
+        min_value=1,
+        allow_null=True,
+        required=False,
+        help_text=_("The maximal size of a single static delta part in megabytes."),
+    )
+    delta_max_bsdiff_size = serializers.IntegerField(
+        min_value=0,
+        allow_null=True,
+        required=False,
+        help_text=_("The maximal size of objects, in megabytes, considered for bsdiff."),
+    )
+    delta_bsdiff_enabled = serializers.BooleanField(
+        allow_null=True,
+        required=False,
+        default=None,
+        help_text=_("An option to use bsdiff when computing differences of objects."),
+    )
+
+    delta_retention = serializers.IntegerField(
+        min_value=0,
+        allow_null=True,
+        required=False,
+        help_text=_(
+            "The number of the latest commits of each ref that static deltas are kept for; deltas "
+            "computed to other commits are removed from new repository versions. All deltas are "
+            "kept if not set."
+        ),
+    )
 
     class Meta:
-        fields = platform.RepositorySerializer.Meta.fields + ("compute_delta",)
+        fields = platform.RepositorySerializer.Meta.fields + (
+            "compute_delta",
+            "delta_depth",
+            "compute_delta_from_scratch",
+            "delta_compression",
+            "delta_min_fallback_size",
+            "delta_max_chunk_size",
+            "delta_max_bsdiff_size",
+            "delta_bsdiff_enabled",
+            "delta_retention",
+        )
         model = models.OstreeRepository
 
 
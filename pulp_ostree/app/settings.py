@@ -0,0 +1,17 @@
+# The maximum number of refs processed concurrently during a sync
+OSTREE_SYNC_REF_CONCURRENCY = 4
+
+# The maximum number of static deltas generated concurrently within a single task
+OSTREE_STATIC_DELTA_WORKERS = 4
+
+# The maximum number of threads hashing objects extracted from imported tarballs; the default of
+# None lets the number grow with the count of CPUs
+OSTREE_HASHING_WORKERS = None
+
+# The number of objects, reused from the storage when importing with trusted checksums, that are
+# randomly picked and verified against their checksums
+OSTREE_TRUSTED_OBJECTS_SAMPLE_SIZE = 100
+
+# The number of seconds an import reading the chunks of an upload in progress waits for the next
+# chunk before it fails
+OSTREE_UPLOAD_CHUNK_TIMEOUT = 3600
@@ -1,11 +1,26 @@
+import asyncio
 import os
+import random
+import shutil
 import tarfile
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
 from gettext import gettext
 
 import gi
 from asgiref.sync import sync_to_async
-
-from pulpcore.plugin.models import Artifact, ProgressReport, Repository
+from django.conf import settings
+from django.db.models import F
+
+from pulpcore.plugin.models import (
+    Artifact,
+    ContentArtifact,
+    ProgressReport,
+    Repository,
+    Upload,
+    UploadChunk,
+)
 from pulpcore.plugin.serializers import RepositoryVersionSerializer
 from pulpcore.plugin.stages import (
     ArtifactSaver,
@@ -23,41 +38,78 @@ from pulp_ostree.app.models import (
     OstreeObject,
     OstreeObjectType,
     OstreeRef,
+    OstreeStaticDelta,
     OstreeSummary,
 )
-from pulp_ostree.app.tasks.stages import DeclarativeContentCreatorMixin, OstreeAssociateContent
-from pulp_ostree.app.tasks.utils import copy_to_local_storage, get_checksum_filepath
+from pulp_ostree.app.tasks.stages import (
+    DeclarativeContentCreatorMixin,
+    OstreeAssociateContent,
+)
+from pulp_ostree.app.tasks.utils import (
+    ConcatenatedFilesReader,
+    build_summary,
+    compute_file_digests,
+    copy_to_local_storage,
+    get_checksum_filepath,
+    get_commit_metadata,
+    get_object_from_path,
+    link_or_copy,
+)
 
 gi.require_version("OSTree", "1.0")
 from gi.repository import Gio, GLib, OSTree  # noqa: E402
 
+# the number of seconds to wait before looking for chunks of an upload in progress again
+UPLOAD_CHUNK_POLL_INTERVAL = 1
+
 
-def import_all_refs_and_commits(artifact_pk, repository_pk, repository_name):
+def import_all_refs_and_commits(
+    artifact_pk,
+    repository_pk,
+    repository_name,
+    trust_checksums=False,
+    upload_pk=None,
+    wait_for_chunks=False,
+):
     """Import all ref and commits to an OSTree repository.
 
     Args:
         artifact_pk (str): The PK of an artifact that identifies a tarball.
         repository_pk (str): The repository PK.
         repository_name (str): The name of an OSTree repository (e.g., "repo").
+        trust_checksums (bool): Whether to reuse artifacts of objects with known checksums
+            instead of hashing the objects.
+        upload_pk (str): The PK of a chunked upload of a tarball passed instead of an artifact.
+        wait_for_chunks (bool): Whether to read the chunks of the upload while they are uploaded.
 
     Raises:
         ValueError: If an OSTree repository could not be properly parsed.
     """
-    tarball_artifact = Artifact.objects.get(pk=artifact_pk)
-    repository = Repository.objects.get(pk=repository_pk)
-    compute_delta = repository.cast().compute_delta
+    tarball_files = get_tarball_files(artifact_pk, upload_pk, wait_for_chunks)
+    repository = Repository.objects.get(pk=repository_pk).cast()
+    compute_delta = repository.compute_delta
     first_stage = OstreeImportAllRefsFirstStage(
-        tarball_artifact, repository_name, compute_delta, repository
+        tarball_files, repository_name, compute_delta, repository, trust_checksums
     )
     dv = OstreeImportDeclarativeVersion(first_stage, repository)
     repover = dv.create()
+    if upload_pk is not None:
+        Upload.objects.filter(pk=upload_pk).delete()
     repover_serialized = RepositoryVersionSerializer(
         instance=repover, context={"request": None}
     ).data
     return repover_serialized
 
 
-def import_child_commits(artifact_pk, repository_pk, repository_name, ref):
+def import_child_commits(
+    artifact_pk,
+    repository_pk,
+    repository_name,
+    ref,
+    trust_checksums=False,
+    upload_pk=None,
+    wait_for_chunks=False,
+):
     """Import child commits to a specific ref.
 
     Args:
@@ -65,25 +117,84 @@ def import_child_commits(artifact_pk, repository_pk, repository_name, ref):
         repository_pk (str): The repository PK.
         repository_name (str): The name of an OSTree repository (e.g., "repo").
         ref (str): The name of a ref object that points to the last commit.
+        trust_checksums (bool): Whether to reuse artifacts of objects with known checksums
+            instead of hashing the objects.
+        upload_pk (str): The PK of a chunked upload of a tarball passed instead of an artifact.
+        wait_for_chunks (bool): Whether to read the chunks of the upload while they are uploaded.
 
     Raises:
         ValueError: If an OSTree repository could not be properly parsed or the specified ref
             does not exist.
     """
-    tarball_artifact = Artifact.objects.get(pk=artifact_pk)
-    repository = Repository.objects.get(pk=repository_pk)
-    compute_delta = repository.cast().compute_delta
+    tarball_files = get_tarball_files(artifact_pk, upload_pk, wait_for_chunks)
+    repository = Repository.objects.get(pk=repository_pk).cast()
+    compute_delta = repository.compute_delta
     first_stage = OstreeImportSingleRefFirstStage(
-        tarball_artifact, repository_name, ref, compute_delta
+        tarball_files, repository_name, ref, compute_delta, repository, trust_checksums
     )
     dv = OstreeImportDeclarativeVersion(first_stage, repository)
     repover = dv.create()
+    if upload_pk is not None:
+        Upload.objects.filter(pk=upload_pk).delete()
     repover_serialized = RepositoryVersionSerializer(
         instance=repover, context={"request": None}
     ).data
     return repover_serialized
 
 
+def get_tarball_files(artifact_pk, upload_pk, wait_for_chunks=False):
+    """Return the files a tarball consists of, in order, from either an artifact or an upload.
+
+    When waiting for chunks, an iterator yielding the chunks of the upload as they are uploaded
+    is returned instead of a list.
+    """
+    if artifact_pk is not None:
+        return [Artifact.objects.get(pk=artifact_pk).file]
+
+    if wait_for_chunks:
+        return iter_upload_chunks(upload_pk, settings.OSTREE_UPLOAD_CHUNK_TIMEOUT)
+
+    chunks = UploadChunk.objects.filter(upload_id=upload_pk).order_by("offset")
+    return [chunk.file for chunk in chunks]
+
+
+def iter_upload_chunks(upload_pk, timeout):
+    """Yield files of an upload's chunks in order, waiting for the chunks not uploaded yet.
+
+    The upload is finished once its chunks cover all of its bytes. Chunks may be uploaded in any
+    order and may overlap; each yielded file is positioned at the first byte not read before.
+
+    Raises:
+        ValueError: If no chunk continuing the upload arrives within the timeout (in seconds).
+    """
+    upload = Upload.objects.get(pk=upload_pk)
+    offset = 0
+    last_chunk_time = time.monotonic()
+    while offset < upload.size:
+        chunk = (
+            UploadChunk.objects.filter(upload_id=upload_pk, offset__lte=offset)
+            .annotate(end=F("offset") + F("size"))
+            .filter(end__gt=offset)
+            .order_by("-end")
+            .first()
+        )
+        if chunk is None:
+            if time.monotonic() - last_chunk_time > timeout:
+                raise ValueError(
+                    gettext(
+                        "No chunk of the upload starting at the byte {} arrived in time."
+                    ).format(offset)
+                )
+            time.sleep(UPLOAD_CHUNK_POLL_INTERVAL)
+            continue
+
+        chunk.file.open("rb")
+        chunk.file.seek(offset - chunk.offset)
+        yield chunk.file
+        offset = chunk.end
+        last_chunk_time = time.monotonic()
+
+
 class OstreeSingleRefParserMixin:
     """A mixin class that allows stages to share the same methods for parsing OSTree data."""
 
@@ -98,22 +209,28 @@ class OstreeSingleRefParserMixin:
         parent_checksum = OSTree.commit_get_parent(ref_commit)
         if not parent_checksum:
             # there are not any parent commits, return and continue parsing the next ref
-            commit = OstreeCommit(checksum=ref_commit_checksum, _pulp_domain=self.domain)
-            commit_dc = self.create_dc(relative_path, commit)
+            commit = OstreeCommit(
+                checksum=ref_commit_checksum,
+                _pulp_domain=self.domain,
+                **get_commit_metadata(ref_commit),
+            )
+            commit_dc = await self.create_dc(relative_path, commit)
             await self.put(commit_dc)
 
             await self.submit_related_objects(commit_dc)
 
-            self.init_ref_object(name, ref_path, commit_dc)
+            await self.init_ref_object(name, ref_path, commit_dc)
 
             return
 
         checksum = ref_commit_checksum
-        ref_commit = OstreeCommit(checksum=checksum, _pulp_domain=self.domain)
-        ref_commit_dc = self.create_dc(relative_path, ref_commit)
+        ref_commit = OstreeCommit(
+            checksum=checksum, _pulp_domain=self.domain, **get_commit_metadata(ref_commit)
+        )
+        ref_commit_dc = await self.create_dc(relative_path, ref_commit)
         self.commit_dcs.append(ref_commit_dc)
 
-        self.init_ref_object(name, ref_path, ref_commit_dc)
+        await self.init_ref_object(name, ref_path, ref_commit_dc)
 
         try:
             _, parent_commit, _ = self.repo.load_commit(parent_checksum)
@@ -149,8 +266,10 @@ class OstreeSingleRefParserMixin:
         first_parent_checksum = parent_checksum
 
         while parent_checksum:
-            commit = OstreeCommit(checksum=checksum, _pulp_domain=self.domain)
-            commit_dc = self.create_dc(relative_path, commit)
+            commit = OstreeCommit(
+                checksum=checksum, _pulp_domain=self.domain, **get_commit_metadata(parent_commit)
+            )
+            commit_dc = await self.create_dc(relative_path, commit)
             self.commit_dcs.append(commit_dc)
 
             checksum = parent_checksum
@@ -172,14 +291,16 @@ class OstreeSingleRefParserMixin:
                     )
             parent_checksum = OSTree.commit_get_parent(parent_commit)
 
-        commit = OstreeCommit(checksum=checksum, _pulp_domain=self.domain)
-        commit_dc = self.create_dc(relative_path, commit)
+        commit = OstreeCommit(
+            checksum=checksum, _pulp_domain=self.domain, **get_commit_metadata(parent_commit)
+        )
+        commit_dc = await self.create_dc(relative_path, commit)
         self.commit_dcs.append(commit_dc)
 
         await self.put(commit_dc)
-        await self.submit_related_objects(commit_dc)
+        oldest_objects = await self.submit_related_objects(commit_dc)
 
-        await self.submit_previous_commits_and_related_objects()
+        await self.submit_previous_commits_and_related_objects(self.commit_dcs, oldest_objects)
 
         return first_parent_checksum, commit_dc
 
@@ -199,16 +320,236 @@ class OstreeSingleRefParserMixin:
 class OstreeImportStage(Stage):
     """A stage generalizing the common methods for initializing an OSTree repository."""
 
-    def __init__(self, repo_name):
+    def __init__(self, repo_name, trust_checksums=False):
         """Initialize class variables that are common for tasks that import OSTree content."""
         super().__init__()
 
         self.repo_name = repo_name.lstrip("/")
+        self.trust_checksums = trust_checksums
         self.repo = None
         self.repo_path = None
+        self.hashing_executor = None
 
         self.commit_dcs = []
-        self.refs_dcs = []
+
+    async def extract_tarball(self):
+        """Extract the uploaded tarball in a single pass while initializing artifacts for objects.
+
+        The members are read from a stream in the order they are stored in, so the tarball does not
+        need to be seekable. Each object is written just once, to a file an artifact is initialized
+        from; the local repository shares the data with the file. Hence, the objects do not take
+        twice the space in the working directory. The files are hashed by a pool of threads while
+        the extraction and the parsing continue. The progress is reported for every file (e.g., a
+        chunk of an upload) the tarball consists of. Artifacts are initialized from the digests only
+        when DeclarativeContent objects are created for the objects.
+
+        When the checksums of objects are trusted, the objects already stored in Pulp are not
+        hashed at all, and their artifacts are reused instead. Only a random sample of them is
+        verified. The extracted repository is opened once the tarball is read.
+        """
+        self.hashing_executor = ThreadPoolExecutor(max_workers=settings.OSTREE_HASHING_WORKERS)
+        # chunks of an upload that is still in progress are not known in advance
+        total = len(self.tarball_files) if isinstance(self.tarball_files, list) else None
+        async with ProgressReport(
+            message="Reading the tarball", code="reading.tarball", total=total
+        ) as pb:
+            # the chunks of an upload in progress are looked up in the database while reading
+            trusted_paths = await sync_to_async(self.read_tarball)(pb)
+
+        self.init_repository()
+
+        known_artifacts = await self.load_known_artifacts(list(trusted_paths))
+        await self.verify_trusted_objects(list(known_artifacts))
+        for relative_path, artifact_path in trusted_paths.items():
+            if (artifact := known_artifacts.get(relative_path)) is not None:
+                self.extracted_artifacts[relative_path] = artifact
+            else:
+                self.submit_hashing(relative_path, artifact_path)
+
+    def read_tarball(self, pb):
+        """Extract the members of the tarball and start hashing the extracted objects.
+
+        Returns the files of objects whose checksums are trusted, keyed by their relative paths;
+        these objects are not hashed until the artifacts already stored in Pulp are looked up.
+        """
+        objects_path = os.path.join(os.path.normpath(self.repo_name), "objects", "")
+        tarball = ConcatenatedFilesReader(self.tarball_files)
+        trusted_paths = {}
+        try:
+            with tarfile.open(fileobj=tarball, mode="r|*") as tar:
+                for member in tar:
+                    if tarball.files_read > pb.done:
+                        # report every chunk of the tarball as soon as it is read
+                        pb.increase_by(tarball.files_read - pb.done)
+
+                    member_path = os.path.normpath(member.name)
+                    if not (member.isfile() and member_path.startswith(objects_path)):
+                        tar.extract(member, path=os.getcwd())
+                        continue
+
+                    relative_path = os.path.relpath(member_path, self.repo_name)
+                    artifact_path = self.extract_object(tar, member)
+                    if self.trust_checksums:
+                        trusted_paths[relative_path] = artifact_path
+                    else:
+                        self.submit_hashing(relative_path, artifact_path)
+        except tarfile.TarError as exc:
+            raise ValueError(gettext("The passed file is not a valid tar archive: {}").format(exc))
+
+        # the padding after the end of the archive is not read by tarfile
+        while tarball.read(1048576):
+            pass
+        if pb.total is None:
+            pb.total = tarball.files_read
+        pb.increase_by(tarball.files_read - pb.done)
+
+        return trusted_paths
+
+    def submit_hashing(self, relative_path, artifact_path):
+        """Start computing digests of an extracted object's file in a worker thread."""
+        future = self.hashing_executor.submit(compute_file_digests, artifact_path)
+        self.hashed_objects[relative_path] = (artifact_path, future)
+
+    def shutdown_hashing_executor(self):
+        """Stop the workers hashing extracted objects; objects not hashed yet are skipped."""
+        if self.hashing_executor is not None:
+            self.hashing_executor.shutdown(cancel_futures=True)
+
+    async def load_known_artifacts(self, relative_paths, batch_size=10000):
+        """Return saved artifacts of objects stored in the domain, keyed by their relative paths.
+
+        The relative path of an object encodes its checksum. Therefore, the commits and other
+        objects are looked up by their indexed checksums first; their artifacts are loaded then.
+        """
+        checksums = {OstreeCommit: [], OstreeObject: []}
+        for relative_path in relative_paths:
+            checksum, obj_type = get_object_from_path(relative_path)
+            if obj_type == OstreeObjectType.OSTREE_OBJECT_TYPE_COMMIT:
+                checksums[OstreeCommit].append(checksum)
+            else:
+                checksums[OstreeObject].append(checksum)
+
+        requested_paths = set(relative_paths)
+        known_artifacts = {}
+        for model, model_checksums in checksums.items():
+            for i in range(0, len(model_checksums), batch_size):
+                contents = model.objects.filter(
+                    checksum__in=model_checksums[i : i + batch_size], _pulp_domain=self.domain
+                ).values_list("pk", "relative_path")
+                content_paths = {
+                    pk: relative_path
+                    async for pk, relative_path in contents
+                    if relative_path in requested_paths
+                }
+                content_artifacts = ContentArtifact.objects.filter(
+                    content__in=list(content_paths), artifact__isnull=False
+                ).select_related("artifact")
+                async for content_artifact in content_artifacts:
+                    relative_path = content_paths[content_artifact.content_id]
+                    known_artifacts[relative_path] = content_artifact.artifact
+
+        # prevent the reused artifacts from being removed as orphans in the meantime
+        known_artifacts_qs = Artifact.objects.filter(
+            pk__in=[artifact.pk for artifact in known_artifacts.values()]
+        )
+        await sync_to_async(known_artifacts_qs.touch)()
+        return known_artifacts
+
+    async def verify_trusted_objects(self, relative_paths):
+        """Verify a random sample of objects whose checksums are trusted.
+
+        The sampled objects are checked against the checksums encoded in their paths. A tarball
+        with a corrupted object is likely to be rejected without hashing all the objects.
+        """
+        sample_size = min(len(relative_paths), settings.OSTREE_TRUSTED_OBJECTS_SAMPLE_SIZE)
+        loop = asyncio.get_running_loop()
+        await asyncio.gather(
+            *(
+                loop.run_in_executor(self.hashing_executor, self.verify_object, relative_path)
+                for relative_path in random.sample(relative_paths, sample_size)
+            )
+        )
+
+    def verify_object(self, relative_path):
+        """Check that the content of an extracted object matches its checksum.
+
+        The repository is opened separately, so the object can be verified in a worker thread.
+        """
+        checksum, obj_type = get_object_from_path(relative_path)
+        repo = OSTree.Repo.new(Gio.File.new_for_path(self.repo_path))
+        repo.open()
+        try:
+            repo.fsck_object(obj_type, checksum, None)
+        except GLib.Error as exc:
+            raise ValueError(
+                gettext("The object '{}' does not match its checksum: {}").format(
+                    relative_path, exc.message
+                )
+            )
+
+    @staticmethod
+    def extract_object(tar, member):
+        """Extract an object from the tarball and return the path to a file holding its data."""
+        with tempfile.NamedTemporaryFile("wb", dir=".", delete=False) as artifact_file:
+            with tar.extractfile(member) as member_file:
+                shutil.copyfileobj(member_file, artifact_file)
+
+        file_path = os.path.join(os.getcwd(), os.path.normpath(member.name))
+        os.makedirs(os.path.dirname(file_path), exist_ok=True)
+        link_or_copy(artifact_file.name, file_path)
+
+        return artifact_file.name
+
+    async def submit_summary(self):
+        """Queue a DeclarativeContent object for a summary of the new repository version.
+
+        The summary is built from the refs and static deltas of the latest repository version and
+        those added by this task. Nothing is copied from the storage, so the cost does not grow
+        with the number of refs. Only deltas targeting head commits of refs are listed.
+        """
+        latest_version = await self.repository.alatest_version()
+
+        head_commits = {ref_dc.content.name: ref_dc.content.commit for ref_dc in self.refs_dcs}
+        # refs that were just added to the repository replace the already uploaded ones
+        refs = await sync_to_async(latest_version.get_content)(
+            OstreeRef.objects.select_related("commit")
+        )
+        async for ref in refs.exclude(name__in=list(head_commits)):
+            head_commits[ref.name] = ref.commit
+
+        commit_sizes = {}
+        async for content_artifact in ContentArtifact.objects.filter(
+            content__in=[commit.pk for commit in head_commits.values()]
+        ).select_related("artifact"):
+            commit_sizes[content_artifact.content_id] = content_artifact.artifact.size
+
+        summary_refs = [
+            (name, commit.checksum, commit_sizes[commit.pk], commit.timestamp, commit.version)
+            for name, commit in head_commits.items()
+        ]
+
+        static_deltas = {}
+        if self.repository.delta_retention != 0:
+            head_checksums = [commit.checksum for commit in head_commits.values()]
+            saved_deltas = await sync_to_async(latest_version.get_content)(
+                OstreeStaticDelta.objects.filter(to_checksum__in=head_checksums)
+            )
+            async for static_delta in saved_deltas:
+                static_deltas[static_delta.from_checksum, static_delta.to_checksum] = static_delta
+            for (from_, to), static_delta in self.static_deltas.items():
+                if to in head_checksums:
+                    static_deltas[from_, to] = static_delta
+
+        summary = build_summary(
+            summary_refs,
+            [
+                (from_, to, static_delta.digest)
+                for (from_, to), static_delta in static_deltas.items()
+            ],
+        )
+        with open(os.path.join(self.repo_path, "summary"), "wb") as f:
+            f.write(summary)
+        await self.submit_metafile_object("summary", OstreeSummary())
 
     def init_repository(self):
         """Initialize new OSTree repository objects."""
@@ -229,23 +570,24 @@ class OstreeImportSingleRefFirstStage(
 ):
     """A first stage of the OSTree importing pipeline that appends child commits to a repository."""
 
-    def __init__(self, tarball_artifact, repo_name, ref, compute_delta):
+    def __init__(
+        self, tarball_files, repo_name, ref, compute_delta, repository, trust_checksums=False
+    ):
         """Initialize class variables used for parsing OSTree objects."""
-        super().__init__(repo_name)
-        self.tarball_artifact = tarball_artifact
+        super().__init__(repo_name, trust_checksums, compute_delta=compute_delta)
+        self.tarball_files = tarball_files
         self.ref = ref
-        self.compute_delta = compute_delta
+        self.repository = repository
 
         self.create_object_dc_func = self.create_dc
 
     async def run(self):
         """Create OSTree content units and associate them with the parent commit."""
-        with tarfile.open(fileobj=self.tarball_artifact.file) as tar:
+        try:
             async with ProgressReport(
                 message="Adding the child commits", code="adding.commits", total=1
             ) as pb:
-                tar.extractall(path=os.getcwd())
-                self.init_repository()
+                await self.extract_tarball()
 
                 last_commit_dc = None
                 _, refs = self.repo.list_refs()
@@ -274,41 +616,51 @@ class OstreeImportSingleRefFirstStage(
                     )
 
                 parent_commit = None
+                oldest_objects = None
 
                 try:
                     parent_commit = await OstreeCommit.objects.aget(
                         checksum=parent_checksum, _pulp_domain=self.domain
                     )
                 except OstreeCommit.DoesNotExist:
-                    pass
+                    if parent_checksum:
+                        # the parent commit is neither stored in Pulp nor present in the tarball;
+                        # the oldest imported commit cannot be attached to it
+                        raise ValueError(
+                            gettext("The parent commit '{}' could not be loaded").format(
+                                parent_checksum
+                            )
+                        )
                 else:
                     last_commit_dc.extra_data["parent_commit"] = parent_commit
                     await self.put(last_commit_dc)
-                    await self.submit_related_objects(last_commit_dc)
+                    oldest_objects = await self.submit_related_objects(last_commit_dc)
 
-                await self.submit_previous_commits_and_related_objects()
+                await self.submit_previous_commits_and_related_objects(
+                    self.commit_dcs, oldest_objects
+                )
 
                 if self.compute_delta:
                     num_of_parsed_commits = len(self.commit_dcs)
 
-                    # ensure there are at least two commits we can compute the static delta between.
-                    if parent_commit and num_of_parsed_commits == 1:
+                    # ensure there are at least two commits we can compute the static delta between;
+                    # otherwise, the latest commits are already present in the temporary repo
+                    if parent_commit and num_of_parsed_commits == 1 and self.repository.delta_depth:
                         await self.copy_from_storage_to_tmp(parent_commit, parent_commit.objs)
-                        await self.compute_static_delta(ref_commit_checksum, parent_commit.checksum)
-                    elif num_of_parsed_commits >= 2:
-                        # the latest 2 commits are already present in the temporary repo; so,
-                        # there is no need to copy files from the storage
-                        ref_parent_commit_checksum = self.commit_dcs[1].content.checksum
-                        await self.compute_static_delta(
-                            ref_commit_checksum, ref_parent_commit_checksum
-                        )
+                    await self.compute_static_deltas(
+                        ref_commit_checksum, self.repository.delta_depth
+                    )
+
+                await self.submit_static_deltas()
 
                 await pb.aincrement()
+        finally:
+            self.shutdown_delta_executor()
+            self.shutdown_hashing_executor()
 
-            await self.submit_ref_objects()
+        await self.submit_ref_objects()
 
-            self.repo.regenerate_summary()
-            await self.submit_metafile_object("summary", OstreeSummary())
+        await self.submit_summary()
 
 
 class OstreeImportAllRefsFirstStage(
@@ -316,28 +668,27 @@ class OstreeImportAllRefsFirstStage(
 ):
     """A first stage of the OSTree importing pipeline that handles creation of content units."""
 
-    def __init__(self, tarball_artifact, repo_name, compute_delta, repository):
+    def __init__(self, tarball_files, repo_name, compute_delta, repository, trust_checksums=False):
         """Initialize class variables used for parsing OSTree objects."""
-        super().__init__(repo_name)
-        self.tarball_artifact = tarball_artifact
-        self.compute_delta = compute_delta
+        super().__init__(repo_name, trust_checksums, compute_delta=compute_delta)
+        self.tarball_files = tarball_files
         self.repository = repository
 
         self.create_object_dc_func = self.create_dc
 
     async def run(self):
         """Create OSTree content units and declare relations between them."""
-        with tarfile.open(fileobj=self.tarball_artifact.file) as tar:
+        try:
             async with ProgressReport(
                 message="Committing the tarball", code="committing.tarball", total=1
             ) as pb:
-                tar.extractall(path=os.getcwd())
-                self.init_repository()
+                await self.extract_tarball()
 
                 await self.submit_metafile_object("config", OstreeConfig())
 
                 _, refs = self.repo.list_refs()
                 for name, ref_commit_checksum in refs.items():
+                    self.commit_dcs = []
                     parsed_result = await self.parse_ref(name, ref_commit_checksum)
 
                     if parsed_result is None:
@@ -350,40 +701,29 @@ class OstreeImportAllRefsFirstStage(
                             checksum=ref_commit_checksum, _pulp_domain=self.domain
                         )
                         parent_commit = commit.parent_commit
-                        if parent_commit and num_of_parsed_commits == 1:
+                        # ensure there are at least two commits we can compute the static delta
+                        # between; otherwise, the latest commits are already present in the
+                        # temporary repo
+                        if (
+                            parent_commit
+                            and num_of_parsed_commits == 1
+                            and self.repository.delta_depth
+                        ):
                             await self.copy_from_storage_to_tmp(parent_commit, parent_commit.objs)
-                            await self.compute_static_delta(
-                                ref_commit_checksum, parent_commit.checksum
-                            )
-                        elif num_of_parsed_commits >= 2:
-                            # the latest 2 commits are already present in the temporary repo; so,
-                            # there is no need to copy files from the storage
-                            ref_parent_commit_checksum = self.commit_dcs[1].content.checksum
-                            await self.compute_static_delta(
-                                ref_commit_checksum, ref_parent_commit_checksum
-                            )
-
-                await pb.aincrement()
-
-            await self.submit_ref_objects()
+                        await self.compute_static_deltas(
+                            ref_commit_checksum, self.repository.delta_depth
+                        )
 
-            latest_version = await self.repository.alatest_version()
+                await self.submit_static_deltas()
 
-            # consider and copy already uploaded refs to correctly regenerate the summary; skip
-            # refs there were just added to the repository as new content
-            refs = await sync_to_async(latest_version.get_content(OstreeRef.objects).exclude)(
-                name__in=(dc.content.name for dc in self.refs_dcs)
-            )
-            async for ref in refs:
-                file_path = os.path.join(self.repo_path, "refs", "heads", ref.name)
-                ref_file = await ref._artifacts.aget()
-                copy_to_local_storage(ref_file.file, file_path)
+                await pb.aincrement()
+        finally:
+            self.shutdown_delta_executor()
+            self.shutdown_hashing_executor()
 
-                commit = await OstreeCommit.objects.aget(refs_commit=ref, _pulp_domain=self.domain)
-                await self.copy_from_storage_to_tmp(commit, OstreeObject.objects.none())
+        await self.submit_ref_objects()
 
-            self.repo.regenerate_summary()
-            await self.submit_metafile_object("summary", OstreeSummary())
+        await self.submit_summary()
 
 
 class QueryExistingArtifactsOstree(Stage):
@@ -395,10 +735,10 @@ class QueryExistingArtifactsOstree(Stage):
             artifacts_digests = []
 
             for d_content in batch:
-                d_artifact = d_content.d_artifacts[0]
-                if d_artifact.artifact._state.adding:
-                    digest_value = d_artifact.artifact.sha256
-                    artifacts_digests.append(digest_value)
+                for d_artifact in d_content.d_artifacts:
+                    if d_artifact.artifact._state.adding:
+                        digest_value = d_artifact.artifact.sha256
+                        artifacts_digests.append(digest_value)
 
             query_params = {
                 "sha256__in": artifacts_digests,
@@ -413,11 +753,11 @@ class QueryExistingArtifactsOstree(Stage):
                 d[result.sha256] = result
 
             for d_content in batch:
-                d_artifact = d_content.d_artifacts[0]
-                artifact_digest = d_artifact.artifact.sha256
-                m = d.get(artifact_digest)
-                if m:
-                    d_artifact.artifact = m
+                for d_artifact in d_content.d_artifacts:
+                    artifact_digest = d_artifact.artifact.sha256
+                    m = d.get(artifact_digest)
+                    if m:
+                        d_artifact.artifact = m
 
             for d_content in batch:
                 await self.put(d_content)
@@ -435,7 +775,7 @@ class OstreeImportDeclarativeVersion(DeclarativeVersion):
             QueryExistingContents(),
             ContentSaver(),
             ResolveContentFutures(),
-            OstreeAssociateContent(),
+            OstreeAssociateContent(self.first_stage.commit_relations),
         ]
 
         return pipeline
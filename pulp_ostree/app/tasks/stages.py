@@ -1,9 +1,12 @@
+import asyncio
 import os
-import shutil
-import tempfile
+import uuid
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
 
 import gi
 from asgiref.sync import sync_to_async
+from django.conf import settings
 
 from pulpcore.plugin.models import Artifact
 from pulpcore.plugin.stages import (
@@ -11,6 +14,7 @@ from pulpcore.plugin.stages import (
     DeclarativeContent,
     Stage,
 )
+from pulpcore.plugin.util import get_domain
 
 from pulp_ostree.app.models import (
     OstreeCommit,
@@ -18,8 +22,19 @@ from pulp_ostree.app.models import (
     OstreeContent,
     OstreeObject,
     OstreeRef,
+    OstreeStaticDelta,
 )
-from pulp_ostree.app.tasks.utils import compute_hash, get_checksum_filepath
+from pulp_ostree.app.tasks.utils import (
+    copy_to_local_storage,
+    generate_static_delta,
+    get_checksum_filepath,
+    get_commit_tree,
+    get_static_delta_params,
+    iter_changed_objects,
+    iter_tree_objects,
+    link_or_copy,
+)
+from pulp_ostree.app.utils import get_delta_index_path, get_static_delta_path
 
 gi.require_version("OSTree", "1.0")
 from gi.repository import GLib, OSTree  # noqa: E402
@@ -28,23 +43,86 @@ from gi.repository import GLib, OSTree  # noqa: E402
 class DeclarativeContentCreatorMixin:
     """A mixin class that defines basic methods for creating declarative content."""
 
-    async def submit_related_objects(self, commit_dc):
-        """Queue DeclarativeContent objects describing standard OSTree objects (e.g., dirtree)."""
-        _, related_objects = self.repo.traverse_commit(commit_dc.content.checksum, maxdepth=0)
-        for obj_checksum, obj_type in related_objects.values():
-            if obj_checksum == commit_dc.content.checksum:
-                continue
+    def __init__(self, *args, compute_delta=False, **kwargs):
+        """Initialize the state shared by the stages creating OSTree content."""
+        super().__init__(*args, **kwargs)
+        self.compute_delta = compute_delta
+
+        self.refs_dcs = []
+        # checksums and types of objects queued in this task, shared by all refs
+        self.submitted_objects = set()
+        # relations between commits and objects stored in bulk by OstreeAssociateContent
+        self.commit_relations = OstreeCommitObjectWriter()
+
+        # static deltas are generated in worker threads not to block the pipeline
+        self.delta_executor = None
+        if compute_delta:
+            self.delta_executor = ThreadPoolExecutor(
+                max_workers=settings.OSTREE_STATIC_DELTA_WORKERS
+            )
+        self.static_delta_futures = {}
+        # saved or newly created static deltas, keyed by the commits they are computed between
+        self.static_deltas = {}
+        # saved artifacts reused for objects extracted from tarballs, keyed by relative paths
+        self.extracted_artifacts = {}
+        # files of objects extracted from tarballs and futures of their digests computed in worker
+        # threads, keyed by relative paths
+        self.hashed_objects = {}
+
+    async def submit_related_objects(self, commit_dc, parent_commit_dc=None, parent_objects=None):
+        """Queue DeclarativeContent objects describing standard OSTree objects (e.g., dirtree).
+
+        Every object is queued just once per task. Objects shared with previously submitted
+        commits are only recorded as additional commit relations.
+
+        When the parent commit and the objects returned for it are passed, only the parts of the
+        tree that differ from the parent's tree are traversed. The returned objects, mapped to the
+        number of their occurrences in the tree, are reused (and modified) for the next child.
+        """
+        commit = await commit_dc.resolution()
+        tree = get_commit_tree(self.repo, commit.checksum)
+
+        if parent_commit_dc is None or parent_objects is None:
+            commit_objects = Counter()
+            for obj_checksum, obj_type, count in iter_tree_objects(self.repo, *tree):
+                commit_objects[obj_checksum, obj_type] += count
+                await self.submit_object(obj_checksum, obj_type)
+        else:
+            commit_objects = parent_objects
+            parent_tree = get_commit_tree(self.repo, parent_commit_dc.content.checksum)
+            for obj_checksum, obj_type, difference in iter_changed_objects(
+                self.repo, parent_tree, tree
+            ):
+                commit_objects[obj_checksum, obj_type] += difference
+                if commit_objects[obj_checksum, obj_type] <= 0:
+                    del commit_objects[obj_checksum, obj_type]
+                elif difference > 0:
+                    await self.submit_object(obj_checksum, obj_type)
+
+        for obj_key in commit_objects:
+            self.commit_relations.add(commit, obj_key)
+
+        return commit_objects
+
+    async def submit_object(self, obj_checksum, obj_type):
+        """Queue a DeclarativeContent object for an OSTree object unless it was queued before.
+
+        Only the checksums and types of queued objects are kept; the DeclarativeContent objects
+        are released once they pass through the pipeline.
+        """
+        if (obj_checksum, obj_type) in self.submitted_objects:
+            return
 
-            obj = OstreeObject(typ=obj_type, checksum=obj_checksum, _pulp_domain=self.domain)
-            obj_relative_path = get_checksum_filepath(obj_checksum, obj_type)
-            object_dc = self.create_object_dc_func(obj_relative_path, obj)
-            object_dc.extra_data["commit_relation"] = await commit_dc.resolution()
-            await self.put(object_dc)
+        obj = OstreeObject(typ=obj_type, checksum=obj_checksum, _pulp_domain=self.domain)
+        obj_relative_path = get_checksum_filepath(obj_checksum, obj_type)
+        object_dc = await self.create_object_dc_func(obj_relative_path, obj)
+        self.submitted_objects.add((obj_checksum, obj_type))
+        await self.put(object_dc)
 
-    def init_ref_object(self, name, relative_path, commit_dc):
+    async def init_ref_object(self, name, relative_path, commit_dc):
         """Initialize a DeclarativeContent object for a ref object."""
         ref = OstreeRef(name=name, _pulp_domain=self.domain)
-        ref_dc = self.create_dc(relative_path, ref)
+        ref_dc = await self.create_dc(relative_path, ref)
         ref_dc.extra_data["ref_commit"] = commit_dc
         self.refs_dcs.append(ref_dc)
 
@@ -57,21 +135,30 @@ class DeclarativeContentCreatorMixin:
 
     async def submit_metafile_object(self, name, metafile_obj):
         """Queue a DeclarativeContent object for either summary or config."""
-        metafile_dc = self.create_dc(name, metafile_obj)
+        metafile_dc = await self.create_dc(name, metafile_obj)
         metafile_dc.content.sha256 = metafile_dc.d_artifacts[0].artifact.sha256
         await self.put(metafile_dc)
 
-    async def submit_previous_commits_and_related_objects(self):
-        """Associate parent and child commits while submitting all related objects to the queue."""
-        for i in reversed(range(len(self.commit_dcs) - 1)):
-            self.commit_dcs[i].extra_data["parent_commit"] = self.commit_dcs[i + 1].content
-
-            await self.put(self.commit_dcs[i])
-            await self.submit_related_objects(self.commit_dcs[i])
+    async def submit_previous_commits_and_related_objects(self, commit_dcs, oldest_objects=None):
+        """Associate parent and child commits while submitting all related objects to the queue.
+
+        The objects of the oldest commit, as returned by submit_related_objects, allow traversing
+        just the changes made by its children.
+        """
+        commit_objects = oldest_objects
+        for i in reversed(range(len(commit_dcs) - 1)):
+            # the parent commit is resolved once it passes through the pipeline; it may be
+            # replaced by an already existing content unit until then
+            commit_dcs[i].extra_data["parent_commit"] = commit_dcs[i + 1]
+
+            await self.put(commit_dcs[i])
+            commit_objects = await self.submit_related_objects(
+                commit_dcs[i], commit_dcs[i + 1], commit_objects
+            )
 
-    def create_dc(self, relative_file_path, content):
+    async def create_dc(self, relative_file_path, content):
         """Create a DeclarativeContent object describing a single OSTree object (e.g., commit)."""
-        artifact = self.init_artifact(relative_file_path)
+        artifact = await self.init_artifact(relative_file_path)
 
         content.relative_path = relative_file_path
 
@@ -86,79 +173,275 @@ class DeclarativeContentCreatorMixin:
 
         return DeclarativeContent(content=content, d_artifacts=[da])
 
-    def init_artifact(self, relative_file_path):
-        """Initialize a new artifact from the passed filepath."""
-        filepath = os.path.join(self.repo_path, relative_file_path)
+    async def init_artifact(self, relative_file_path):
+        """Initialize a new artifact from the passed filepath.
+
+        A saved artifact found for an object extracted from a tarball is reused. An artifact of
+        other extracted objects is initialized as soon as the worker thread hashing the object's
+        file finishes, so the objects are hashed while the parsing goes on.
+        """
+        if (artifact := self.extracted_artifacts.pop(relative_file_path, None)) is not None:
+            return artifact
 
-        # we still need to keep the file in the local repository for further processing
-        with tempfile.NamedTemporaryFile("wb", dir=".", delete=False) as new_file:
-            with open(filepath, mode="rb") as f:
-                shutil.copyfileobj(f, new_file)
-                new_file.flush()
+        if (hashed_object := self.hashed_objects.pop(relative_file_path, None)) is not None:
+            artifact_path, future = hashed_object
+            size, digests = await asyncio.wrap_future(future)
+            # the artifact is initialized in the task's thread; the domain of the task is not
+            # visible to the worker threads
+            return Artifact(file=artifact_path, size=size, pulp_domain=self.domain, **digests)
 
-        return Artifact.init_and_validate(new_file.name)
+        filepath = os.path.join(self.repo_path, relative_file_path)
 
-    async def compute_static_delta(self, ref_commit_checksum, parent_checksum=None):
-        if not self.commit_dcs:
+        # the file is still needed in the local repository for further processing; the artifact
+        # shares the data with it instead of holding a copy whenever possible
+        artifact_path = os.path.join(os.getcwd(), f"artifact-{uuid.uuid4()}")
+        link_or_copy(filepath, artifact_path)
+
+        return Artifact.init_and_validate(artifact_path)
+
+    async def compute_static_deltas(self, ref_commit_checksum, depth):
+        """Start generating static deltas from the last parent commits of a ref to its head.
+
+        A delta is generated from each of the last ``depth`` parent commits that are completely
+        present in the local repository and, if configured, from scratch.
+        """
+        _, commit, _ = self.repo.load_commit(ref_commit_checksum)
+        parent_checksum = OSTree.commit_get_parent(commit)
+        while depth > 0 and parent_checksum:
+            try:
+                _, commit, state = self.repo.load_commit(parent_checksum)
+            except GLib.Error:
+                break
+            if state & OSTree.RepoCommitState.PARTIAL:
+                break
+
+            await self.compute_static_delta(ref_commit_checksum, parent_checksum)
+            parent_checksum = OSTree.commit_get_parent(commit)
+            depth -= 1
+
+        if self.repository.compute_delta_from_scratch:
+            await self.compute_static_delta(ref_commit_checksum, None)
+
+    async def compute_static_delta(self, ref_commit_checksum, parent_checksum):
+        """Start generating a static delta between the parent commit and the latest commit of a ref.
+
+        No parent commit stands for a delta from scratch. The delta is generated in a worker
+        thread, so the pipeline is not blocked in the meantime.
+        """
+        delta_key = (parent_checksum, ref_commit_checksum)
+        if delta_key in self.static_delta_futures or delta_key in self.static_deltas:
             return
 
-        if parent_checksum:
-            from_ = parent_checksum
-        else:
-            from_ = self.commit_dcs[0].content.checksum
+        if static_delta := await self.reuse_static_delta(parent_checksum, ref_commit_checksum):
+            self.static_deltas[delta_key] = static_delta
+            return
 
-        # latest commit
-        to = ref_commit_checksum
+        loop = asyncio.get_running_loop()
+        future = loop.run_in_executor(
+            self.delta_executor,
+            generate_static_delta,
+            self.repo_path,
+            parent_checksum,
+            ref_commit_checksum,
+            get_static_delta_params(self.repository),
+        )
+        self.static_delta_futures[delta_key] = future
+
+    async def reuse_static_delta(self, from_, to):
+        """Queue and return an already saved static delta between two commits, if there is any.
 
-        self.repo.static_delta_generate(
-            OSTree.StaticDeltaGenerateOpt.MAJOR, from_, to, None, GLib.Variant("a{sv}", None)
+        A delta computed by any other task within the domain is reused. Its superblock is copied
+        to the local repository, so the delta can be listed in the delta index.
+        """
+        static_delta = (
+            await OstreeStaticDelta.objects.filter(
+                from_checksum=from_, to_checksum=to, _pulp_domain=self.domain
+            )
+            .order_by("-pulp_created")
+            .afirst()
         )
+        if static_delta is None or not await self.submit_saved_static_delta(static_delta):
+            return None
 
-        for dirpath, dirnames, filenames in os.walk(os.path.join(self.repo_path, "deltas/")):
-            for filename in filenames:
-                full_path = os.path.join(dirpath, filename)
-                relative_path = os.path.relpath(full_path, self.repo_path)
+        return static_delta
+
+    async def submit_saved_static_delta(self, static_delta):
+        """Queue an already saved static delta and return True unless it is generated locally.
+
+        The delta's superblock is copied to the local repository, so the delta can be listed in
+        the delta index.
+        """
+        superblock_path = os.path.join(static_delta.relative_path, "superblock")
+        local_superblock_path = os.path.join(self.repo_path, superblock_path)
+        if os.path.exists(local_superblock_path):
+            # the delta is already part of the local repository
+            return False
+
+        superblock = await static_delta.contentartifact_set.select_related("artifact").aget(
+            relative_path=superblock_path
+        )
+        copy_to_local_storage(superblock.artifact.file, local_superblock_path)
+
+        await self.put(DeclarativeContent(content=static_delta))
+        return True
+
+    async def submit_static_deltas(self):
+        """Wait for the generated static deltas and queue DeclarativeContent objects for them.
 
-                content = OstreeContent(
-                    relative_path=relative_path,
-                    digest=compute_hash(full_path),
-                    _pulp_domain=self.domain,
+        Delta indexes of the commits the deltas target are published along with the deltas.
+        """
+        await asyncio.gather(*self.static_delta_futures.values())
+
+        for from_, to in self.static_delta_futures:
+            static_delta_dc = await self.create_static_delta_dc(from_, to)
+            self.static_deltas[from_, to] = static_delta_dc.content
+            await self.put(static_delta_dc)
+
+        # clients look up deltas targeting a commit in its delta index instead of probing for
+        # superblocks of all possible deltas
+        for to in {to for _, to in self.static_deltas}:
+            self.repo.static_delta_reindex(
+                OSTree.StaticDeltaIndexFlags.STATIC_DELTA_INDEX_FLAGS_NONE, to, None
+            )
+            delta_index_dc = await self.create_dc(get_delta_index_path(to), OstreeContent())
+            delta_index_dc.content.digest = delta_index_dc.d_artifacts[0].artifact.sha256
+            await self.put(delta_index_dc)
+
+    def shutdown_delta_executor(self):
+        """Stop the workers generating static deltas; deltas not started yet are cancelled."""
+        if self.delta_executor is not None:
+            self.delta_executor.shutdown(cancel_futures=True)
+
+    async def create_static_delta_dc(self, from_, to):
+        """Create a DeclarativeContent object for a generated static delta.
+
+        Delta files may span gigabytes. Therefore, the artifacts' digests, computed while
+        initializing the artifacts, are reused.
+        """
+        delta_path = get_static_delta_path(from_, to)
+
+        d_artifacts = []
+        for dirpath, dirnames, filenames in os.walk(os.path.join(self.repo_path, delta_path)):
+            for filename in filenames:
+                relative_path = os.path.relpath(os.path.join(dirpath, filename), self.repo_path)
+                artifact = await self.init_artifact(relative_path)
+                da = DeclarativeArtifact(
+                    artifact=artifact, url="hackathon", relative_path=relative_path
                 )
-                content_dc = self.create_dc(relative_path, content)
-                await self.put(content_dc)
+                d_artifacts.append(da)
+
+        superblock_path = os.path.join(delta_path, "superblock")
+        superblock = next(da.artifact for da in d_artifacts if da.relative_path == superblock_path)
+        static_delta = OstreeStaticDelta(
+            from_checksum=from_,
+            to_checksum=to,
+            relative_path=delta_path,
+            digest=superblock.sha256,
+            parts=len(d_artifacts) - 1,
+            size=sum(da.artifact.size for da in d_artifacts),
+            _pulp_domain=self.domain,
+        )
+        return DeclarativeContent(content=static_delta, d_artifacts=d_artifacts)
+
+
+class OstreeCommitObjectWriter:
+    """A writer storing relations between commits and objects in bulk.
+
+    The relations are kept as pairs of primary keys. A relation to an object is held back by the
+    object's checksum and type until the object passes through the pipeline. Relations to objects
+    saved before the relation was added are resolved by a single query once a batch is full.
+    Hence, no index of all objects saved in the task needs to be kept.
+    """
+
+    def __init__(self, batch_size=10000):
+        """Initialize the collected relations."""
+        self.batch_size = batch_size
+        self.domain = get_domain()
+        self.pairs = set()
+        # primary keys of commits, keyed by checksums and types of objects not resolved yet
+        self.pending = {}
+        self.num_of_pending = 0
+
+    def add(self, commit, obj_key):
+        """Record a relation between a saved commit and an object given by its checksum and type."""
+        self.pending.setdefault(obj_key, []).append(commit.pk)
+        self.num_of_pending += 1
+
+    def content_saved(self, dc):
+        """Turn the relations held back for the saved object into pairs of primary keys."""
+        if not isinstance(dc.content, OstreeObject):
+            return
+
+        commit_pks = self.pending.pop((dc.content.checksum, dc.content.typ), [])
+        self.num_of_pending -= len(commit_pks)
+        self.pairs.update((commit_pk, dc.content.pk) for commit_pk in commit_pks)
+
+    async def resolve_pending(self):
+        """Turn the relations held back for objects that are already saved into pairs."""
+        saved_objects = OstreeObject.objects.filter(
+            checksum__in={checksum for checksum, _ in self.pending}, _pulp_domain=self.domain
+        ).values_list("pk", "checksum", "typ")
+        async for obj_pk, checksum, typ in saved_objects:
+            commit_pks = self.pending.pop((checksum, typ), [])
+            self.num_of_pending -= len(commit_pks)
+            self.pairs.update((commit_pk, obj_pk) for commit_pk in commit_pks)
+
+    async def flush(self, force=False):
+        """Store the collected relations once there are enough of them for a single batch.
+
+        Every object passes through the pipeline before the relations are forcibly flushed; at
+        that point, all relations can be resolved.
+        """
+        if len(self.pairs) + self.num_of_pending < self.batch_size and not force:
+            return
+
+        if self.pending:
+            await self.resolve_pending()
+        if not self.pairs:
+            return
+
+        commits_to_objects = [
+            OstreeCommitObject(commit_id=commit_pk, obj_id=obj_pk)
+            for commit_pk, obj_pk in self.pairs
+        ]
+        self.pairs = set()
+        await sync_to_async(OstreeCommitObject.objects.bulk_create)(
+            objs=commits_to_objects, ignore_conflicts=True, batch_size=self.batch_size
+        )
 
 
 class OstreeAssociateContent(Stage):
     """A stage for creating associations between OSTree objects."""
 
+    def __init__(self, commit_relations=None):
+        """Initialize the stage with a writer of relations between commits and objects."""
+        super().__init__()
+        self.commit_relations = commit_relations or OstreeCommitObjectWriter()
+
     async def run(self):
         """Create relations between each OSTree object specified in DeclarativeContent objects."""
         async for batch in self.batches():
             updated_commits = []
-            commits_to_objects = []
             for dc in batch:
                 if dc.extra_data.get("parent_commit"):
-                    updated_commits.append(self.associate_parent_commit(dc))
-                elif dc.extra_data.get("commit_relation"):
-                    commits_to_objects.append(self.associate_obj_commit(dc))
+                    updated_commits.append(await self.associate_parent_commit(dc))
+                self.commit_relations.content_saved(dc)
 
             await sync_to_async(OstreeCommit.objects.bulk_update)(
                 objs=updated_commits, fields=["parent_commit"], batch_size=1000
             )
-            await sync_to_async(OstreeCommitObject.objects.bulk_create)(
-                objs=commits_to_objects, ignore_conflicts=True, batch_size=1000
-            )
+            await self.commit_relations.flush()
 
             for dc in batch:
                 await self.put(dc)
 
-    def associate_parent_commit(self, dc):
+        await self.commit_relations.flush(force=True)
+
+    async def associate_parent_commit(self, dc):
         """Assign the parent commit to its child commit."""
         parent_commit = dc.extra_data.get("parent_commit")
+        if isinstance(parent_commit, DeclarativeContent):
+            # parent commits are always queued before their children
+            parent_commit = await parent_commit.resolution()
         dc.content.parent_commit = parent_commit
         return dc.content
-
-    def associate_obj_commit(self, dc):
-        """Assign the commit to its referenced object."""
-        related_content = dc.extra_data.get("commit_relation")
-        return OstreeCommitObject(commit=related_content, obj=dc.content)
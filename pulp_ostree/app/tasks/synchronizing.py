@@ -1,3 +1,4 @@
+import asyncio
 import logging
 import os
 from fnmatch import fnmatch
@@ -6,6 +7,8 @@ from pathlib import Path
 from urllib.parse import urljoin
 
 import gi
+from asgiref.sync import sync_to_async
+from django.conf import settings
 
 from pulpcore.plugin.models import Artifact, ProgressReport, Remote, Repository
 from pulpcore.plugin.serializers import RepositoryVersionSerializer
@@ -26,12 +29,21 @@ from pulpcore.plugin.stages import (
 from pulp_ostree.app.models import (
     OstreeCommit,
     OstreeConfig,
+    OstreeObject,
     OstreeObjectType,
     OstreeRemote,
+    OstreeStaticDelta,
     OstreeSummary,
 )
-from pulp_ostree.app.tasks.stages import DeclarativeContentCreatorMixin, OstreeAssociateContent
-from pulp_ostree.app.tasks.utils import bytes_to_checksum, get_checksum_filepath
+from pulp_ostree.app.tasks.stages import (
+    DeclarativeContentCreatorMixin,
+    OstreeAssociateContent,
+)
+from pulp_ostree.app.tasks.utils import (
+    bytes_to_checksum,
+    get_checksum_filepath,
+    get_commit_metadata,
+)
 
 gi.require_version("OSTree", "1.0")
 from gi.repository import Gio, GLib, OSTree  # noqa: E402
@@ -55,130 +67,341 @@ def synchronize(remote_pk, repository_pk, mirror):
 
     """
     remote = OstreeRemote.objects.get(pk=remote_pk)
-    repository = Repository.objects.get(pk=repository_pk)
+    repository = Repository.objects.get(pk=repository_pk).cast()
 
     if not remote.url:
         raise ValueError(_("A remote must have a url specified to synchronize."))
 
+    sync_details = get_sync_details(remote, repository, mirror)
+    if is_sync_skippable(repository, sync_details):
+        log.info(_("The remote repository has not changed since the last sync; skipping."))
+        return RepositoryVersionSerializer(
+            instance=repository.latest_version(), context={"request": None}
+        ).data
+
     deferred_download = remote.policy != Remote.IMMEDIATE
-    compute_delta = repository.cast().compute_delta
-    first_stage = OstreeFirstStage(remote, deferred_download, compute_delta)
+    compute_delta = repository.compute_delta
+    first_stage = OstreeFirstStage(remote, deferred_download, compute_delta, repository, mirror)
     dv = OstreeSyncDeclarativeVersion(first_stage, repository, mirror=mirror)
     repover = dv.create()
     repover_serialized = RepositoryVersionSerializer(
         instance=repover, context={"request": None}
     ).data
+
+    sync_details["most_recent_version"] = repository.latest_version().number
+    repository.last_sync_details = sync_details
+    repository.save(update_fields=["last_sync_details"])
+
     return repover_serialized
 
 
+def get_sync_details(remote, repository, mirror):
+    """Describe the state of the remote repository and all options that affect the sync result.
+
+    The remote summary lists all refs with their head commits; hence, its checksum changes
+    whenever there is a new commit available on the remote.
+    """
+    downloader = remote.get_downloader(url=urljoin(remote.url, "summary"))
+    summary_sha256 = downloader.fetch().artifact_attributes["sha256"]
+
+    return {
+        "remote_pk": str(remote.pk),
+        "url": remote.url,
+        "policy": remote.policy,
+        "depth": remote.depth,
+        "include_refs": remote.include_refs,
+        "exclude_refs": remote.exclude_refs,
+        "mirror": mirror,
+        "compute_delta": repository.compute_delta,
+        "delta_depth": repository.delta_depth,
+        "compute_delta_from_scratch": repository.compute_delta_from_scratch,
+        "delta_compression": repository.delta_compression,
+        "delta_min_fallback_size": repository.delta_min_fallback_size,
+        "delta_max_chunk_size": repository.delta_max_chunk_size,
+        "delta_max_bsdiff_size": repository.delta_max_bsdiff_size,
+        "delta_bsdiff_enabled": repository.delta_bsdiff_enabled,
+        "summary_sha256": summary_sha256,
+    }
+
+
+def is_sync_skippable(repository, sync_details):
+    """Check if the last sync used the same options and the remote summary has not changed."""
+    latest_version = repository.latest_version()
+    last_sync_details = dict(repository.last_sync_details)
+
+    if last_sync_details.pop("most_recent_version", None) != latest_version.number:
+        # the repository was modified after the last sync
+        return False
+
+    if last_sync_details != sync_details:
+        return False
+
+    # the summary stored in the repository is the summary downloaded during the last sync
+    summary = latest_version.get_content(OstreeSummary.objects).first()
+    return summary is not None and summary.sha256 == sync_details["summary_sha256"]
+
+
 class OstreeFirstStage(DeclarativeContentCreatorMixin, Stage):
     """A first stage of the OSTree syncing pipeline that handles creation of content units."""
 
-    def __init__(self, remote, deferred_download, compute_delta):
+    def __init__(self, remote, deferred_download, compute_delta, repository, mirror):
         """Initialize class variables used for parsing OSTree objects."""
-        super().__init__()
+        super().__init__(compute_delta=compute_delta)
         self.remote = remote
         self.deferred_download = deferred_download
-        self.compute_delta = compute_delta
+        self.repository = repository
+        self.mirror = mirror
+
+        # only commits within the synced history can be considered for computing static deltas
+        self.delta_depth = min(repository.delta_depth, remote.depth)
+        self.compute_delta_from_scratch = repository.compute_delta_from_scratch
 
         self.repo_name = remote.name
         self.repo = None
         self.repo_path = None
 
-        self.commit_dcs = []
-        self.refs_dcs = []
+        # downloads of dirtree objects, keyed by their checksums, shared by all refs
+        self.dirtree_downloads = {}
+        # dirtree checksums whose whole subtrees are already present in the local repository
+        self.complete_dirtrees = set()
+        # commits created by refs processed in this task, keyed by their checksums
+        self.claimed_commit_dcs = {}
+
+        # commits from the latest repository version, keyed by their checksums
+        self.known_commits = {}
+        self.known_commit_dcs = {}
+        # already saved commits, keyed by their PKs, that need to be kept when mirroring
+        self.retained_commits = {}
 
-        self.create_object_dc_func = self.create_remote_artifact_dc
+        if deferred_download:
+            self.create_object_dc_func = self.create_remote_artifact_dc
+        else:
+            self.create_object_dc_func = self.create_pulled_artifact_dc
 
     async def run(self):
         """Create OSTree content units and declare relations between them."""
-        async with ProgressReport(
-            message="Parsing Metadata", code="sync.parsing_metadata", total=1
-        ) as pb:
-            self.init_repository()
-
-            await self.submit_metafiles()
-
-            _, refs = self.repo.remote_list_refs(self.repo_name)
-            for name in self.filter_refs(refs.keys()):
-                ref_commit_checksum = refs[name]
-
-                ref_relative_path = os.path.join("refs/heads/", name)
-                local_ref_path = os.path.join(self.repo_path, ref_relative_path)
-
-                dirname = os.path.dirname(local_ref_path)
-                # create a directory to prevent IOError
-                os.makedirs(dirname, exist_ok=True)
-
-                with open(local_ref_path, "w") as f:
-                    f.write(ref_commit_checksum)
-                    f.flush()
-
-                relative_path = get_checksum_filepath(
-                    ref_commit_checksum, OstreeObjectType.OSTREE_OBJECT_TYPE_COMMIT
-                )
-                await self.download_remote_object(relative_path)
-
-                _, ref_commit, _ = self.repo.load_commit(ref_commit_checksum)
-                ref_parent_checksum = parent_checksum = OSTree.commit_get_parent(ref_commit)
-                if not parent_checksum or self.remote.depth == 0:
-                    # there are not any parent commits, continue parsing the next head branch
-                    commit = OstreeCommit(checksum=ref_commit_checksum, _pulp_domain=self.domain)
-                    commit_dc = self.create_dc(relative_path, commit)
-                    await self.put(commit_dc)
-
-                    await self.submit_related_objects(commit_dc)
-
-                    self.init_ref_object(name, ref_relative_path, commit_dc)
-
-                    continue
-
-                checksum = ref_commit_checksum
-                ref_commit = OstreeCommit(checksum=checksum, _pulp_domain=self.domain)
-                ref_commit_dc = self.create_dc(relative_path, ref_commit)
-                self.commit_dcs.append(ref_commit_dc)
-
-                relative_path = get_checksum_filepath(
-                    parent_checksum, OstreeObjectType.OSTREE_OBJECT_TYPE_COMMIT
-                )
-                await self.download_remote_object(relative_path)
-                _, parent_commit, _ = self.repo.load_commit(parent_checksum)
-                parent_checksum = OSTree.commit_get_parent(parent_commit)
-
-                max_depth = self.remote.depth
-
-                while parent_checksum and max_depth > 0:
-                    commit = OstreeCommit(checksum=checksum, _pulp_domain=self.domain)
-                    commit_dc = self.create_dc(relative_path, commit)
-                    self.commit_dcs.append(commit_dc)
-
-                    checksum = parent_checksum
-                    relative_path = get_checksum_filepath(
-                        checksum, OstreeObjectType.OSTREE_OBJECT_TYPE_COMMIT
-                    )
-                    await self.download_remote_object(relative_path)
-                    _, parent_commit, _ = self.repo.load_commit(checksum)
-                    parent_checksum = OSTree.commit_get_parent(parent_commit)
-
-                    max_depth -= 1
+        try:
+            async with ProgressReport(
+                message="Parsing Metadata", code="sync.parsing_metadata", total=1
+            ) as pb:
+                self.init_repository()
+
+                await self.submit_metafiles()
+
+                self.known_commits = await self.load_known_commits()
+
+                _, refs = self.repo.remote_list_refs(self.repo_name)
+                filtered_refs = self.filter_refs(refs.keys())
+
+                # refs whose heads are already known do not bring any new content
+                updated_refs = [
+                    name for name in filtered_refs if refs[name] not in self.known_commits
+                ]
+
+                if updated_refs and not self.deferred_download:
+                    # the objects of new commits are pulled in advance and turned into artifacts in
+                    # place; the commits alone are pulled first to find the first known commits
+                    self.pull_refs(updated_refs, depth=self.remote.depth, commit_only=True)
+                    refs_by_depth = {}
+                    for name in updated_refs:
+                        depth = self.get_pull_depth(refs[name])
+                        refs_by_depth.setdefault(depth, []).append(name)
+                    for depth, refs_to_pull in refs_by_depth.items():
+                        self.pull_refs(refs_to_pull, depth=depth)
+                elif self.compute_delta and (self.delta_depth or self.compute_delta_from_scratch):
+                    # the deltas are computed from the content of the commits which is not present
+                    # in the local repository when syncing just the metadata; the content of all
+                    # updated refs is pulled at once, so their deltas can be generated concurrently
+                    if updated_refs:
+                        self.pull_refs(updated_refs, depth=self.delta_depth)
+
+                semaphore = asyncio.Semaphore(settings.OSTREE_SYNC_REF_CONCURRENCY)
+
+                async def _process_ref(name):
+                    async with semaphore:
+                        await self.process_ref(name, refs[name])
+
+                await asyncio.gather(*(_process_ref(name) for name in filtered_refs))
+
+                if self.mirror:
+                    await self.submit_retained_objects()
+
+                await self.submit_static_deltas()
+
+                await pb.aincrement()
+        finally:
+            self.shutdown_delta_executor()
 
-                commit = OstreeCommit(checksum=checksum, _pulp_domain=self.domain)
-                commit_dc = self.create_dc(relative_path, commit)
-                self.commit_dcs.append(commit_dc)
-
-                await self.put(commit_dc)
-                await self.submit_related_objects(commit_dc)
-
-                await self.submit_previous_commits_and_related_objects()
+        await self.submit_ref_objects()
 
-                self.init_ref_object(name, ref_relative_path, ref_commit_dc)
+    async def process_ref(self, name, ref_commit_checksum):
+        """Queue the commits of a single ref together with their related objects."""
+        ref_relative_path = os.path.join("refs/heads/", name)
+        local_ref_path = os.path.join(self.repo_path, ref_relative_path)
+
+        dirname = os.path.dirname(local_ref_path)
+        # create a directory to prevent IOError
+        os.makedirs(dirname, exist_ok=True)
+
+        with open(local_ref_path, "w") as f:
+            f.write(ref_commit_checksum)
+            f.flush()
+
+        commit_dcs, known_commit_dc = await self.walk_commits(ref_commit_checksum)
+
+        if known_commit_dc is not None and commit_dcs:
+            # the history is already present in the repository from this point on
+            commit_dcs[-1].extra_data["parent_commit"] = known_commit_dc
+
+        if not commit_dcs:
+            # the ref still points to the same commit; there is nothing new to parse
+            await self.init_ref_object(name, ref_relative_path, known_commit_dc)
+            return
+
+        oldest_commit_dc = commit_dcs[-1]
+        await self.put(oldest_commit_dc)
+        oldest_objects = await self.submit_related_objects(oldest_commit_dc)
+
+        await self.submit_previous_commits_and_related_objects(commit_dcs, oldest_objects)
+
+        ref_commit_dc = commit_dcs[0]
+        await self.init_ref_object(name, ref_relative_path, ref_commit_dc)
+
+        if self.compute_delta:
+            await self.compute_static_deltas(ref_commit_checksum, self.delta_depth)
+
+    def get_pull_depth(self, ref_commit_checksum):
+        """Return the number of parent commits of a ref whose content needs to be pulled.
+
+        Only commits preceding the first known commit are new to the repository. The content of
+        older commits is pulled only when static deltas are computed from them.
+        """
+        num_of_new_commits = 0
+        checksum = ref_commit_checksum
+        while checksum and checksum not in self.known_commits:
+            num_of_new_commits += 1
+            if num_of_new_commits > self.remote.depth:
+                break
+            try:
+                _, loaded_commit, _ = self.repo.load_commit(checksum)
+            except GLib.Error:
+                # the remote does not provide the rest of the history
+                break
+            checksum = OSTree.commit_get_parent(loaded_commit)
+
+        depth = num_of_new_commits - 1
+        if self.compute_delta:
+            depth = max(depth, self.delta_depth)
+        return min(depth, self.remote.depth)
+
+    async def load_known_commits(self):
+        """Load commits from the latest repository version in a single query."""
+        latest_version = await self.repository.alatest_version()
+        if latest_version is None:
+            return {}
+
+        commits = latest_version.get_content(OstreeCommit.objects).filter(_pulp_domain=self.domain)
+        return {commit.checksum: commit async for commit in commits}
+
+    async def walk_commits(self, ref_commit_checksum):
+        """Walk the history of a ref until the specified depth or an already known commit.
+
+        Returns a tuple of DeclarativeContent objects for the new commits, ordered from the ref's
+        head, and a DeclarativeContent object for the first known commit, if any. A commit that
+        was already claimed by another ref processed in this task is considered known too; its
+        ancestors are handled by that ref.
+        """
+        commit_dcs = []
+        checksum = ref_commit_checksum
+
+        while checksum:
+            if known_commit := self.known_commits.get(checksum):
+                remaining_depth = self.remote.depth - len(commit_dcs)
+                return commit_dcs, await self.submit_known_commit(known_commit, remaining_depth)
 
-                if self.compute_delta:
-                    await self.compute_static_delta(ref_commit_checksum, ref_parent_checksum)
+            relative_path = get_checksum_filepath(
+                checksum, OstreeObjectType.OSTREE_OBJECT_TYPE_COMMIT
+            )
+            await self.download_missing_objects([relative_path])
 
-            await pb.aincrement()
+            if claimed_commit_dc := self.claimed_commit_dcs.get(checksum):
+                # wait for the other ref to queue the commit; child commits cannot be queued
+                # before their parent commit
+                await claimed_commit_dc.resolution()
+                return commit_dcs, claimed_commit_dc
 
-        await self.submit_ref_objects()
+            _, loaded_commit, _ = self.repo.load_commit(checksum)
+            commit = OstreeCommit(
+                checksum=checksum, _pulp_domain=self.domain, **get_commit_metadata(loaded_commit)
+            )
+            commit_dc = await self.create_dc(relative_path, commit)
+            self.claimed_commit_dcs[checksum] = commit_dc
+            commit_dcs.append(commit_dc)
+
+            if len(commit_dcs) > self.remote.depth:
+                break
+
+            checksum = OSTree.commit_get_parent(loaded_commit)
+
+        return commit_dcs, None
+
+    async def submit_known_commit(self, known_commit, depth):
+        """Queue a DeclarativeContent object for a commit that is already in the repository.
+
+        When mirroring, the commit's ancestors within the depth are remembered as well, so that
+        they, together with their objects, can be kept in the new repository version without
+        traversing them again.
+        """
+        if known_commit_dc := self.known_commit_dcs.get(known_commit.pk):
+            return known_commit_dc
+
+        known_commit_dc = DeclarativeContent(content=known_commit)
+        self.known_commit_dcs[known_commit.pk] = known_commit_dc
+        await self.put(known_commit_dc)
+
+        if self.mirror:
+            known_commits_by_pk = {commit.pk: commit for commit in self.known_commits.values()}
+
+            commit = known_commit
+            while commit is not None and depth >= 0:
+                self.retained_commits[commit.pk] = commit
+                commit = known_commits_by_pk.get(commit.parent_commit_id)
+                depth -= 1
+
+        return known_commit_dc
+
+    async def submit_retained_objects(self):
+        """Queue already saved commits and objects that are retained in the mirrored version.
+
+        Saved static deltas targeting the retained commits are kept as well. Their targets' delta
+        indexes are regenerated together with the indexes of newly computed deltas.
+        """
+        for commit_pk, commit in self.retained_commits.items():
+            if commit_pk not in self.known_commit_dcs:
+                await self.put(DeclarativeContent(content=commit))
+
+        retained_objects = OstreeObject.objects.filter(
+            commit_object__commit__in=self.retained_commits.keys()
+        ).distinct()
+        async for obj in retained_objects:
+            if (obj.checksum, obj.typ) not in self.submitted_objects:
+                await self.put(DeclarativeContent(content=obj))
+
+        if not self.retained_commits:
+            return
+
+        latest_version = await self.repository.alatest_version()
+        retained_deltas = await sync_to_async(latest_version.get_content)(
+            OstreeStaticDelta.objects.filter(
+                to_checksum__in=[commit.checksum for commit in self.retained_commits.values()]
+            )
+        )
+        async for static_delta in retained_deltas:
+            delta_key = (static_delta.from_checksum, static_delta.to_checksum)
+            if delta_key in self.static_delta_futures or delta_key in self.static_deltas:
+                continue
+            if await self.submit_saved_static_delta(static_delta):
+                self.static_deltas[delta_key] = static_delta
 
     def filter_refs(self, refs):
         """Filter refs by the list of include/exclude patterns."""
@@ -207,10 +430,21 @@ class OstreeFirstStage(DeclarativeContentCreatorMixin, Stage):
         gpg_verify_variant = GLib.Variant("a{sv}", no_gpg_verify)
         self.repo.remote_add(self.repo_name, self.remote.url, gpg_verify_variant)
 
-        # TODO: with this, we will no longer need to manually download ostree content because all
-        #   the content will be available in place; refactoring the code is necessary:
-        #   https://github.com/pulp/pulp_ostree/issues/169#issuecomment-1476232489
-        self.repo.pull(self.repo_name, None, OSTree.RepoPullFlags.MIRROR)
+    def pull_refs(self, refs, depth=0, commit_only=False):
+        """Pull the refs together with the specified number of parent commits from the remote.
+
+        With ``commit_only``, just the commit objects are pulled, without their content.
+        """
+        flags = int(OSTree.RepoPullFlags.MIRROR)
+        if commit_only:
+            flags |= int(OSTree.RepoPullFlags.COMMIT_ONLY)
+
+        options = {
+            "refs": GLib.Variant("as", refs),
+            "depth": GLib.Variant("i", depth),
+            "flags": GLib.Variant("i", flags),
+        }
+        self.repo.pull_with_options(self.repo_name, GLib.Variant("a{sv}", options), None, None)
 
     async def submit_metafiles(self):
         """Download config and summary files and create DeclarativeContent objects for them."""
@@ -230,7 +464,29 @@ class OstreeFirstStage(DeclarativeContentCreatorMixin, Stage):
         full_path.parent.mkdir(parents=True, exist_ok=True)
         os.rename(downloader.path, full_path)
 
-    def create_remote_artifact_dc(self, relative_path, content):
+    async def create_pulled_artifact_dc(self, relative_path, content):
+        """Create a declarative content from an object that was pulled to the local repository.
+
+        The pulled file is turned into an artifact right away, so the object is not downloaded for
+        the second time by the ArtifactDownloader stage. A remote artifact is still recorded to
+        allow repairing the content later. Objects missing in the local repository (e.g., commits
+        deeper in the history than the pull went) fall back to being downloaded.
+        """
+        if not os.path.exists(os.path.join(self.repo_path, relative_path)):
+            return await self.create_remote_artifact_dc(relative_path, content)
+
+        content.relative_path = relative_path
+
+        da = DeclarativeArtifact(
+            artifact=await self.init_artifact(relative_path),
+            remote=self.remote,
+            url=urljoin(self.remote.url, relative_path),
+            relative_path=relative_path,
+        )
+
+        return DeclarativeContent(content=content, d_artifacts=[da])
+
+    async def create_remote_artifact_dc(self, relative_path, content):
         """Create a declarative artifact that will have associated a remote artifact with it."""
         content_url = urljoin(self.remote.url, relative_path)
 
@@ -246,7 +502,7 @@ class OstreeFirstStage(DeclarativeContentCreatorMixin, Stage):
 
         return DeclarativeContent(content=content, d_artifacts=[da])
 
-    async def submit_related_objects(self, commit_dc):
+    async def submit_related_objects(self, commit_dc, parent_commit_dc=None, parent_objects=None):
         """Queue related DeclarativeContent objects and additionally download dirtree metadata."""
         _, loaded_commit, _ = self.repo.load_commit(commit_dc.content.checksum)
 
@@ -254,28 +510,56 @@ class OstreeFirstStage(DeclarativeContentCreatorMixin, Stage):
         # be executed without errors; the traversing allows us to read all referenced checksums,
         # meaning that in the end we will have a list of all objects referenced by a single commit
         dirtree_checksum = bytes_to_checksum(loaded_commit[6])
-        relative_path = get_checksum_filepath(
-            dirtree_checksum, OstreeObjectType.OSTREE_OBJECT_TYPE_DIR_TREE
+        await self.download_dirtrees({dirtree_checksum})
+
+        return await super().submit_related_objects(commit_dc, parent_commit_dc, parent_objects)
+
+    async def download_missing_objects(self, relative_paths):
+        """Download objects that are not present in the local repository yet.
+
+        The downloaders are built by the remote's downloader factory which shares a single
+        semaphore among all of them; therefore, the number of downloads in flight never exceeds
+        the remote's ``download_concurrency``.
+        """
+        await asyncio.gather(
+            *(
+                self.download_remote_object(relative_path)
+                for relative_path in relative_paths
+                if not os.path.exists(os.path.join(self.repo_path, relative_path))
+            )
         )
-        await self.download_remote_object(relative_path)
-
-        _, dirtree_obj = self.repo.load_variant(OSTree.ObjectType.DIR_TREE, dirtree_checksum)
-        subtree_checksums = {bytes_to_checksum(subtree[1]) for subtree in dirtree_obj[1]}
-        await self.download_dirtrees(subtree_checksums)
-
-        await super().submit_related_objects(commit_dc)
 
     async def download_dirtrees(self, subtree_checksums):
-        """Recursively download dirtree objects and their sub-dirtree objects."""
-        for subtree_checksum in subtree_checksums:
+        """Download dirtree objects and their sub-dirtree objects level by level.
+
+        Every level of the tree is fetched concurrently. A dirtree is downloaded just once even if
+        multiple refs reference it at the same time. Subtrees that were completely downloaded for
+        any previously processed commit are not descended into again.
+        """
+        visited = set()
+        pending = set(subtree_checksums) - self.complete_dirtrees
+        while pending:
+            visited.update(pending)
+            await asyncio.gather(*(self.download_dirtree(checksum) for checksum in pending))
+
+            next_level = set()
+            for checksum in pending:
+                _, dirtree_obj = self.repo.load_variant(OSTree.ObjectType.DIR_TREE, checksum)
+                next_level.update(bytes_to_checksum(subtree[1]) for subtree in dirtree_obj[1])
+
+            pending = next_level - visited - self.complete_dirtrees
+
+        self.complete_dirtrees.update(visited)
+
+    def download_dirtree(self, checksum):
+        """Return a future of the dirtree download that is shared among all refs."""
+        if (download := self.dirtree_downloads.get(checksum)) is None:
             relative_path = get_checksum_filepath(
-                subtree_checksum, OstreeObjectType.OSTREE_OBJECT_TYPE_DIR_TREE
+                checksum, OstreeObjectType.OSTREE_OBJECT_TYPE_DIR_TREE
             )
-            await self.download_remote_object(relative_path)
-
-            _, dirtree_obj = self.repo.load_variant(OSTree.ObjectType.DIR_TREE, subtree_checksum)
-            child_subtree_checksums = {bytes_to_checksum(subtree[1]) for subtree in dirtree_obj[1]}
-            await self.download_dirtrees(child_subtree_checksums)
+            download = asyncio.ensure_future(self.download_missing_objects([relative_path]))
+            self.dirtree_downloads[checksum] = download
+        return download
 
 
 class OstreeSyncDeclarativeVersion(DeclarativeVersion):
@@ -292,7 +576,7 @@ class OstreeSyncDeclarativeVersion(DeclarativeVersion):
             ContentSaver(),
             RemoteArtifactSaver(),
             ResolveContentFutures(),
-            OstreeAssociateContent(),
+            OstreeAssociateContent(self.first_stage.commit_relations),
         ]
 
         return pipeline
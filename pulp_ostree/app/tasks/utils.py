@@ -1,7 +1,23 @@
-import hashlib
+import fcntl
+import io
 import os
+import shutil
+import sys
+import time
+from collections import Counter
 
-from pulp_ostree.app.models import OstreeObjectType
+import gi
+
+from pulpcore.plugin import pulp_hashlib
+from pulpcore.plugin.models import Artifact
+
+from pulp_ostree.app.models import DeltaCompression, OstreeObjectType
+
+gi.require_version("OSTree", "1.0")
+from gi.repository import Gio, GLib, OSTree  # noqa: E402
+
+# the ioctl request cloning a file on file systems with copy-on-write support (e.g., Btrfs, XFS)
+FICLONE = 0x40049409
 
 
 def get_checksum_filepath(checksum, obj_type):
@@ -10,6 +26,15 @@ def get_checksum_filepath(checksum, obj_type):
     return os.path.join("objects/", checksum[:2], f"{checksum[2:]}.{extension}")
 
 
+def get_object_from_path(relative_path):
+    """Return the checksum and the OSTree type of an object stored at the relative path."""
+    prefix, filename = relative_path.split("/")[-2:]
+    checksum_suffix, _, extension = filename.partition(".")
+    # file objects are stored compressed in archive repositories
+    obj_type = OSTree.object_type_from_string("file" if extension == "filez" else extension)
+    return f"{prefix}{checksum_suffix}", obj_type
+
+
 def get_file_extension(obj_type):
     """Return a file extension based on the type of the object."""
     if obj_type == OstreeObjectType.OSTREE_OBJECT_TYPE_FILE:
@@ -27,14 +52,223 @@ def bytes_to_checksum(int_bytes):
     return "".join(["%02x" % v for v in int_bytes])
 
 
-def compute_hash(filepath):
-    """Compute the sha256 hash of a file described by its path."""
-    sha256_hash = hashlib.sha256()
-    with open(filepath, "rb") as f:
-        # Read and update hash string value in blocks of 4K
-        for byte_block in iter(lambda: f.read(4096), b""):
-            sha256_hash.update(byte_block)
-        return sha256_hash.hexdigest()
+def get_commit_tree(repo, commit_checksum):
+    """Return checksums of the root dirtree and dirmeta objects of a commit."""
+    _, commit, _ = repo.load_commit(commit_checksum)
+    return bytes_to_checksum(commit[6]), bytes_to_checksum(commit[7])
+
+
+def get_commit_metadata(commit):
+    """Return the timestamp and the version (None if not set) of a loaded commit as model fields."""
+    version = commit.get_child_value(0).lookup_value(
+        OSTree.COMMIT_META_KEY_VERSION, GLib.VariantType.new("s")
+    )
+    return {
+        "timestamp": OSTree.commit_get_timestamp(commit),
+        "version": version.get_string() if version is not None else None,
+    }
+
+
+def load_dirtree(repo, checksum):
+    """Return files and subdirectories of a dirtree object keyed by their names."""
+    _, dirtree = repo.load_variant(OSTree.ObjectType.DIR_TREE, checksum)
+    files = {name: bytes_to_checksum(file_checksum) for name, file_checksum in dirtree[0]}
+    dirs = {
+        name: (bytes_to_checksum(subtree_checksum), bytes_to_checksum(submeta_checksum))
+        for name, subtree_checksum, submeta_checksum in dirtree[1]
+    }
+    return files, dirs
+
+
+def iter_tree_objects(repo, dirtree_checksum, dirmeta_checksum):
+    """Yield checksums, types, and numbers of occurrences of all objects within a tree.
+
+    Every distinct subtree is walked once and its objects are yielded as soon as they are read.
+    Subtrees occurring more than once (e.g., the same directory under two names) are counted
+    while walking; their objects are yielded again with the number of extra occurrences only
+    after the whole tree is visited, so that no subtree is walked repeatedly.
+    """
+    root = (dirtree_checksum, dirmeta_checksum)
+    subtrees = {root: Counter()}
+    pending = [root]
+    while pending:
+        subtree = pending.pop()
+        yield from _iter_subtree_objects(repo, subtree, subtrees[subtree], count=1)
+        for child in subtrees[subtree]:
+            if child not in subtrees:
+                subtrees[child] = Counter()
+                pending.append(child)
+
+    # visit subtrees in a topological order to get the number of their occurrences in the tree
+    parents = Counter(child for children in subtrees.values() for child in children)
+    occurrences = Counter({root: 1})
+    pending = [root]
+    while pending:
+        subtree = pending.pop()
+        for child, count in subtrees[subtree].items():
+            occurrences[child] += occurrences[subtree] * count
+            parents[child] -= 1
+            if parents[child] == 0:
+                pending.append(child)
+
+    for subtree, count in occurrences.items():
+        if count > 1:
+            yield from _iter_subtree_objects(repo, subtree, Counter(), count=count - 1)
+
+
+def _iter_subtree_objects(repo, subtree, children, count):
+    """Yield objects of a single directory, each with the given count, and record its subtrees."""
+    dirtree_checksum, dirmeta_checksum = subtree
+    yield dirmeta_checksum, OstreeObjectType.OSTREE_OBJECT_TYPE_DIR_META, count
+    yield dirtree_checksum, OstreeObjectType.OSTREE_OBJECT_TYPE_DIR_TREE, count
+
+    files, dirs = load_dirtree(repo, dirtree_checksum)
+    for file_checksum in files.values():
+        yield file_checksum, OstreeObjectType.OSTREE_OBJECT_TYPE_FILE, count
+    children.update(dirs.values())
+
+
+def iter_changed_objects(repo, old_tree, new_tree):
+    """Yield objects removed from the old tree and added to the new tree.
+
+    The trees are pairs of dirtree and dirmeta checksums. Removed objects are yielded as tuples of
+    their checksums, types, and negative numbers of removed occurrences; added objects with
+    positive numbers of added occurrences. Only dirtree objects whose checksums differ are
+    descended into, and identical pairs of changed subtrees are compared just once.
+    """
+    pending = Counter({(old_tree, new_tree): 1})
+    while pending:
+        ((old_dirtree, old_dirmeta), (new_dirtree, new_dirmeta)), count = pending.popitem()
+        if old_dirmeta != new_dirmeta:
+            yield old_dirmeta, OstreeObjectType.OSTREE_OBJECT_TYPE_DIR_META, -count
+            yield new_dirmeta, OstreeObjectType.OSTREE_OBJECT_TYPE_DIR_META, count
+        if old_dirtree == new_dirtree:
+            continue
+        yield old_dirtree, OstreeObjectType.OSTREE_OBJECT_TYPE_DIR_TREE, -count
+        yield new_dirtree, OstreeObjectType.OSTREE_OBJECT_TYPE_DIR_TREE, count
+
+        old_files, old_dirs = load_dirtree(repo, old_dirtree)
+        new_files, new_dirs = load_dirtree(repo, new_dirtree)
+
+        for name, file_checksum in old_files.items():
+            if new_files.get(name) != file_checksum:
+                yield file_checksum, OstreeObjectType.OSTREE_OBJECT_TYPE_FILE, -count
+        for name, file_checksum in new_files.items():
+            if old_files.get(name) != file_checksum:
+                yield file_checksum, OstreeObjectType.OSTREE_OBJECT_TYPE_FILE, count
+
+        for name, old_subtree in old_dirs.items():
+            if (new_subtree := new_dirs.get(name)) is not None:
+                pending[old_subtree, new_subtree] += count
+            else:
+                for obj_checksum, obj_type, obj_count in iter_tree_objects(repo, *old_subtree):
+                    yield obj_checksum, obj_type, -obj_count * count
+        for name, new_subtree in new_dirs.items():
+            if name not in old_dirs:
+                for obj_checksum, obj_type, obj_count in iter_tree_objects(repo, *new_subtree):
+                    yield obj_checksum, obj_type, obj_count * count
+
+
+def get_static_delta_params(repository):
+    """Return parameters for generating static deltas as configured for the repository."""
+    params = {}
+    if repository.delta_compression is not None:
+        compression = "0" if repository.delta_compression == DeltaCompression.NONE else "x"
+        params["compression"] = GLib.Variant("y", ord(compression))
+    if repository.delta_min_fallback_size is not None:
+        params["min-fallback-size"] = GLib.Variant("u", repository.delta_min_fallback_size)
+    if repository.delta_max_chunk_size is not None:
+        params["max-chunk-size"] = GLib.Variant("u", repository.delta_max_chunk_size)
+    if repository.delta_max_bsdiff_size is not None:
+        params["max-bsdiff-size"] = GLib.Variant("u", repository.delta_max_bsdiff_size)
+    if repository.delta_bsdiff_enabled is not None:
+        params["bsdiff-enabled"] = GLib.Variant("b", repository.delta_bsdiff_enabled)
+    return params
+
+
+def generate_static_delta(repo_path, from_, to, params):
+    """Generate a static delta between two commits of the repository located at the path.
+
+    The repository is opened separately, so the delta can be generated in a worker thread.
+    """
+    repo = OSTree.Repo.new(Gio.File.new_for_path(repo_path))
+    repo.open()
+    repo.static_delta_generate(
+        OSTree.StaticDeltaGenerateOpt.MAJOR, from_, to, None, GLib.Variant("a{sv}", params)
+    )
+
+
+def to_big_endian(value):
+    """Return an unsigned 64-bit integer natively encoded as the value in big-endian."""
+    return int.from_bytes(value.to_bytes(8, "big"), sys.byteorder)
+
+
+def build_summary(refs, static_deltas):
+    """Return the content of a summary file listing the refs and static deltas.
+
+    The refs are tuples of names, checksums, sizes, timestamps, and versions (None if unknown) of
+    head commits. The static deltas are tuples of source and target commits (no source commit stands
+    for a delta from scratch) and digests of superblocks. The layout follows the one generated by
+    ostree_repo_regenerate_summary(), including the big-endian encoding of integer metadata.
+    """
+    summary_refs = []
+    for name, checksum, size, timestamp, version in sorted(refs, key=lambda ref: ref[0]):
+        commit_metadata = {}
+        if timestamp is not None:
+            commit_metadata["ostree.commit.timestamp"] = GLib.Variant("t", to_big_endian(timestamp))
+        if version is not None:
+            commit_metadata["ostree.commit.version"] = GLib.Variant("s", version)
+        summary_refs.append((name, (size, bytes.fromhex(checksum), commit_metadata)))
+
+    summary_deltas = {
+        f"{from_}-{to}" if from_ else to: GLib.Variant("ay", bytes.fromhex(digest))
+        for from_, to, digest in static_deltas
+    }
+    metadata = {
+        "ostree.static-deltas": GLib.Variant("a{sv}", summary_deltas),
+        "ostree.summary.indexed-deltas": GLib.Variant("b", True),
+        "ostree.summary.last-modified": GLib.Variant("t", to_big_endian(int(time.time()))),
+        "ostree.summary.mode": GLib.Variant("s", "archive-z2"),
+    }
+
+    summary = GLib.Variant("(a(s(taya{sv}))a{sv})", (summary_refs, metadata))
+    return summary.get_data_as_bytes().get_data()
+
+
+def compute_file_digests(path):
+    """Return the size of a file and its digests for all the algorithms artifacts track.
+
+    The file is read in a single pass. Unlike Artifact.init_and_validate(), no model is
+    initialized; it is safe to call from worker threads.
+    """
+    hashers = {name: pulp_hashlib.new(name) for name in Artifact.DIGEST_FIELDS}
+    size = 0
+    with open(path, "rb") as f:
+        while chunk := f.read(1048576):
+            for hasher in hashers.values():
+                hasher.update(chunk)
+            size += len(chunk)
+
+    return size, {name: hasher.hexdigest() for name, hasher in hashers.items()}
+
+
+def link_or_copy(src_path, dst_path):
+    """Create a file sharing the data with the source file, copying the data only if necessary.
+
+    A hard link is preferred. A reflink is created if hard links are not permitted and the file
+    system supports it. Otherwise, the file is copied.
+    """
+    try:
+        os.link(src_path, dst_path)
+        return
+    except OSError:
+        pass
+
+    with open(src_path, "rb") as src_f, open(dst_path, "wb") as dst_f:
+        try:
+            fcntl.ioctl(dst_f.fileno(), FICLONE, src_f.fileno())
+        except OSError:
+            shutil.copyfileobj(src_f, dst_f)
 
 
 def copy_to_local_storage(remote_file, local_path):
@@ -45,3 +279,33 @@ def copy_to_local_storage(remote_file, local_path):
         with open(local_path, "wb") as local_f:
             local_f.write(remote_f.read())
             local_f.flush()
+
+
+class ConcatenatedFilesReader(io.RawIOBase):
+    """A readable stream of files concatenated in the passed order (e.g., chunks of an upload).
+
+    The number of files that were read completely is tracked, so the progress can be reported.
+    """
+
+    def __init__(self, files):
+        """Initialize the stream with the first file."""
+        super().__init__()
+        self.files = iter(files)
+        self.current_file = next(self.files, None)
+        self.files_read = 0
+
+    def readable(self):
+        """Mark the stream as readable."""
+        return True
+
+    def readinto(self, buffer):
+        """Read data from the current file into the buffer, moving on to the next file if needed."""
+        while self.current_file is not None:
+            if data := self.current_file.read(len(buffer)):
+                buffer[: len(data)] = data
+                return len(data)
+
+            self.current_file.close()
+            self.files_read += 1
+            self.current_file = next(self.files, None)
+        return 0
@@ -0,0 +1,27 @@
+import base64
+import os
+
+
+def checksum_to_modified_base64(checksum):
+    """Encode a checksum in the base64 variant used by OSTree for static delta paths."""
+    encoded = base64.b64encode(bytes.fromhex(checksum)).decode()
+    return encoded.rstrip("=").replace("/", "_")
+
+
+def get_static_delta_path(from_, to):
+    """Return the relative path to a directory with a static delta between two commits.
+
+    No commit to compute the delta from stands for a delta from scratch.
+    """
+    to_b64 = checksum_to_modified_base64(to)
+    if from_ is None:
+        return os.path.join("deltas/", to_b64[:2], to_b64[2:])
+
+    from_b64 = checksum_to_modified_base64(from_)
+    return os.path.join("deltas/", from_b64[:2], f"{from_b64[2:]}-{to_b64}")
+
+
+def get_delta_index_path(to):
+    """Return the relative path to an index of static deltas targeting the commit."""
+    to_b64 = checksum_to_modified_base64(to)
+    return os.path.join("delta-indexes/", to_b64[:2], f"{to_b64[2:]}.index")
@@ -161,6 +161,7 @@ class OstreeRepositoryViewSet(core.RepositoryViewSet, ModifyRepositoryActionMixi
                 "condition": [
                     "has_model_or_domain_or_obj_perms:ostree.import_commits_ostreerepository",
                     "has_model_or_domain_or_obj_perms:ostree.view_ostreerepository",
+                    "has_upload_param_model_or_domain_or_obj_perms:core.change_upload",
                 ],
             },
             {
@@ -246,16 +247,22 @@ class OstreeRepositoryViewSet(core.RepositoryViewSet, ModifyRepositoryActionMixi
         )
         serializer.is_valid(raise_exception=True)
 
-        artifact = serializer.validated_data["artifact"]
+        artifact = serializer.validated_data.get("artifact")
+        upload = serializer.validated_data.get("upload")
         repository_name = serializer.validated_data["repository_name"]
+        trust_checksums = serializer.validated_data["trust_checksums"]
+        wait_for_chunks = serializer.validated_data["wait_for_chunks"]
 
         async_result = dispatch(
             tasks.import_all_refs_and_commits,
-            exclusive_resources=[artifact, repository],
+            exclusive_resources=[artifact or upload, repository],
             kwargs={
-                "artifact_pk": str(artifact.pk),
+                "artifact_pk": str(artifact.pk) if artifact else None,
+                "upload_pk": str(upload.pk) if upload else None,
                 "repository_pk": str(repository.pk),
                 "repository_name": repository_name,
+                "trust_checksums": trust_checksums,
+                "wait_for_chunks": wait_for_chunks,
             },
         )
         return core.OperationPostponedResponse(async_result, request)
@@ -279,18 +286,24 @@ class OstreeRepositoryViewSet(core.RepositoryViewSet, ModifyRepositoryActionMixi
         )
         serializer.is_valid(raise_exception=True)
 
-        artifact = serializer.validated_data["artifact"]
+        artifact = serializer.validated_data.get("artifact")
+        upload = serializer.validated_data.get("upload")
         repository_name = serializer.validated_data["repository_name"]
         ref = serializer.validated_data["ref"]
+        trust_checksums = serializer.validated_data["trust_checksums"]
+        wait_for_chunks = serializer.validated_data["wait_for_chunks"]
 
         async_result = dispatch(
             tasks.import_child_commits,
-            exclusive_resources=[artifact, repository],
+            exclusive_resources=[artifact or upload, repository],
             kwargs={
-                "artifact_pk": str(artifact.pk),
+                "artifact_pk": str(artifact.pk) if artifact else None,
+                "upload_pk": str(upload.pk) if upload else None,
                 "repository_pk": str(repository.pk),
                 "repository_name": repository_name,
                 "ref": ref,
+                "trust_checksums": trust_checksums,
+                "wait_for_chunks": wait_for_chunks,
             },
         )
         return core.OperationPostponedResponse(async_result, request)
@@ -608,6 +621,34 @@ class OstreeContentViewSet(OstreeContentQuerySetMixin, SingleArtifactContentUplo
     }
 
 
+class OstreeStaticDeltaFilter(ContentFilter):
+    """A filterset class for static deltas."""
+
+    class Meta:
+        model = models.OstreeStaticDelta
+        fields = {"from_checksum": ["exact", "isnull"], "to_checksum": ["exact"]}
+
+
+class OstreeStaticDeltaViewSet(OstreeContentQuerySetMixin, ReadOnlyContentViewSet):
+    """A ViewSet class for OSTree static deltas."""
+
+    endpoint_name = "deltas"
+    queryset = models.OstreeStaticDelta.objects.all()
+    serializer_class = serializers.OstreeStaticDeltaSerializer
+    filterset_class = OstreeStaticDeltaFilter
+
+    DEFAULT_ACCESS_POLICY = {
+        "statements": [
+            {
+                "action": ["list", "retrieve"],
+                "principal": "authenticated",
+                "effect": "allow",
+            },
+        ],
+        "queryset_scoping": {"function": "get_content_qs"},
+    }
+
+
 class OstreeConfigViewSet(OstreeContentQuerySetMixin, ReadOnlyContentViewSet):
     """A ViewSet class for OSTree repository configurations."""
 
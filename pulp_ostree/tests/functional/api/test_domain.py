@@ -1,6 +1,12 @@
+import os
+import subprocess
+import uuid
+
 import pytest
 from django.conf import settings
 
+from pulpcore.client.pulp_ostree import OstreeImportAll
+
 if not settings.DOMAIN_ENABLED:
     pytest.skip("Domains not enabled.", allow_module_level=True)
 
@@ -34,3 +40,46 @@ def test_domains(
     assert domain_name in distribution.pulp_href
     result = ostree_distributions_api_client.list(pulp_domain=domain_name)
     assert result.count == 1
+
+
+@pytest.mark.parallel
+def test_import_into_domain(
+    domain_factory,
+    pulpcore_bindings,
+    gen_object_with_cleanup,
+    monitor_task,
+    ostree_repository_factory,
+    ostree_repositories_api_client,
+    ostree_repositories_versions_api_client,
+    tmp_path,
+):
+    """Import a tarball into a repository within a domain and check that artifacts stay in it."""
+    domain = domain_factory()
+    domain_name = domain.name
+
+    os.chdir(tmp_path)
+    repo_name = str(uuid.uuid4())
+    sample_dir = tmp_path / str(uuid.uuid4())
+    sample_dir.mkdir()
+    (sample_dir / str(uuid.uuid4())).write_bytes(os.urandom(1024))
+
+    subprocess.run(["ostree", f"--repo={repo_name}", "init", "--mode=archive"])
+    subprocess.run(["ostree", f"--repo={repo_name}", "commit", "--branch=foo", f"{sample_dir}/"])
+    subprocess.run(["tar", "-cvf", f"{repo_name}.tar", f"{repo_name}/"])
+
+    artifact = gen_object_with_cleanup(
+        pulpcore_bindings.ArtifactsApi, f"{repo_name}.tar", pulp_domain=domain_name
+    )
+    repository = ostree_repository_factory(pulp_domain=domain_name)
+    import_data = OstreeImportAll(artifact=artifact.pulp_href, repository_name=repo_name)
+    response = ostree_repositories_api_client.import_all(repository.pulp_href, import_data)
+    repo_version = monitor_task(response.task).created_resources[0]
+    assert domain_name in repo_version
+
+    added_content = ostree_repositories_versions_api_client.read(repo_version).content_summary.added
+    assert added_content["ostree.commit"]["count"] == 1
+    assert added_content["ostree.object"]["count"] == 3
+
+    # the artifacts of objects hashed in worker threads are created within the domain too
+    artifacts = pulpcore_bindings.ArtifactsApi.list(pulp_domain=domain_name)
+    assert artifacts.count >= 1 + added_content["ostree.object"]["count"]
@@ -13,6 +13,8 @@ from pulpcore.client.pulp_ostree import (
     OstreeImportAll,
     OstreeImportCommitsToRef,
 )
+from pulpcore.client.pulp_ostree.exceptions import ApiException
+from pulpcore.tests.functional.utils import PulpTaskError
 
 from pulp_ostree.tests.functional.utils import (
     init_local_repo_with_remote,
@@ -179,11 +181,14 @@ def single_ref_import(
             ]
         )
 
+        subprocess.check_output(["ostree", f"--repo={repo_name1}", "static-delta", "reindex"])
+
         deltas_paths = []
-        for dirpath, _, filenames in os.walk(os.path.join(repo_name1, "deltas/")):
-            for filename in filenames:
-                full_path = os.path.join(dirpath, filename)
-                deltas_paths.append(os.path.relpath(full_path, repo_name1))
+        for deltas_dir in ("deltas/", "delta-indexes/"):
+            for dirpath, _, filenames in os.walk(os.path.join(repo_name1, deltas_dir)):
+                for filename in filenames:
+                    full_path = os.path.join(dirpath, filename)
+                    deltas_paths.append(os.path.relpath(full_path, repo_name1))
 
         shutil.rmtree(repo_name1)
 
@@ -236,7 +241,7 @@ def single_ref_import(
         remote_name = init_local_repo_with_remote(repo_name2, ostree_repo_path)
         validate_repo_integrity(repo_name2, f"{remote_name}:foo", set(commits_to_check))
 
-        # 12. check if static deltas are being published
+        # 12. check if static deltas and their indexes are being published
         for delta_path in deltas_paths:
             response = http_get(urljoin(ostree_repo_path, delta_path))
             assert response
@@ -291,6 +296,7 @@ def test_import_commits_same_ref(
     pulpcore_bindings,
     gen_object_with_cleanup,
     monitor_task,
+    ostree_content_deltas_api_client,
     ostree_repository_factory,
     ostree_repositories_api_client,
     ostree_repositories_versions_api_client,
@@ -358,9 +364,229 @@ def test_import_commits_same_ref(
     added_content = repository_version.content_summary.added
     assert added_content["ostree.refs"]["count"] == 1
     assert added_content["ostree.commit"]["count"] == 1
-    assert added_content["ostree.content"]["count"] == 2
+    assert added_content["ostree.delta"]["count"] == 1
     assert added_content["ostree.summary"]["count"] == 1
 
+    with open(f"{repo_name}/refs/heads/{branch_name}", "r") as ref:
+        child_commit = ref.read().strip()
+
+    deltas = ostree_content_deltas_api_client.list(repository_version=repo_version).results
+    assert len(deltas) == 1
+    assert deltas[0].from_checksum == parent_commit
+    assert deltas[0].to_checksum == child_commit
+    assert deltas[0].parts == 1
+
+
+def create_tarball_with_commits(repo_name, sample_dir, branch_name, num_of_commits):
+    """Commit a new file to the branch of a new local repository for every commit and pack it."""
+    subprocess.run(["ostree", f"--repo={repo_name}", "init", "--mode=archive"])
+    sample_dir.mkdir()
+    commits = []
+    for _ in range(num_of_commits):
+        (sample_dir / str(uuid.uuid4())).touch()
+        subprocess.run(
+            ["ostree", f"--repo={repo_name}", "commit", f"--branch={branch_name}", f"{sample_dir}/"]
+        )
+        with open(f"{repo_name}/refs/heads/{branch_name}", "r") as ref:
+            commits.append(ref.read().strip())
+    subprocess.run(["tar", "-cvf", f"{repo_name}.tar", f"{repo_name}/"])
+    return commits
+
+
+@pytest.mark.parallel
+def test_import_deltas_depth_and_from_scratch(
+    pulpcore_bindings,
+    gen_object_with_cleanup,
+    monitor_task,
+    ostree_content_deltas_api_client,
+    ostree_repository_factory,
+    ostree_repositories_api_client,
+    tmp_path,
+):
+    """Import three commits of a ref into a repository computing deltas from two parents."""
+    os.chdir(tmp_path)
+    repo_name = "repo"
+    commit1, commit2, commit3 = create_tarball_with_commits(
+        repo_name, tmp_path / str(uuid.uuid4()), "foo", 3
+    )
+
+    artifact = gen_object_with_cleanup(pulpcore_bindings.ArtifactsApi, f"{repo_name}.tar")
+    repo = ostree_repository_factory(name=repo_name, delta_depth=2, compute_delta_from_scratch=True)
+    import_data = OstreeImportAll(artifact=artifact.pulp_href, repository_name=repo_name)
+    response = ostree_repositories_api_client.import_all(repo.pulp_href, import_data)
+    repo_version = monitor_task(response.task).created_resources[0]
+
+    deltas = ostree_content_deltas_api_client.list(repository_version=repo_version).results
+    assert {(delta.from_checksum, delta.to_checksum) for delta in deltas} == {
+        (commit2, commit3),
+        (commit1, commit3),
+        (None, commit3),
+    }
+
+
+@pytest.mark.parallel
+def test_import_reuses_deltas_within_domain(
+    pulpcore_bindings,
+    gen_object_with_cleanup,
+    monitor_task,
+    ostree_content_deltas_api_client,
+    ostree_repository_factory,
+    ostree_repositories_api_client,
+    tmp_path,
+):
+    """Import the same commits into two repositories and check the second one reuses deltas."""
+    os.chdir(tmp_path)
+    repo_name = "repo"
+    _, parent_commit, child_commit = create_tarball_with_commits(
+        repo_name, tmp_path / str(uuid.uuid4()), "foo", 3
+    )
+    artifact = gen_object_with_cleanup(pulpcore_bindings.ArtifactsApi, f"{repo_name}.tar")
+
+    deltas = []
+    for _ in range(2):
+        repo = ostree_repository_factory(name=str(uuid.uuid4()))
+        import_data = OstreeImportAll(artifact=artifact.pulp_href, repository_name=repo_name)
+        response = ostree_repositories_api_client.import_all(repo.pulp_href, import_data)
+        repo_version = monitor_task(response.task).created_resources[0]
+        deltas.append(
+            ostree_content_deltas_api_client.list(repository_version=repo_version).results
+        )
+
+    first_deltas, second_deltas = deltas
+    assert len(first_deltas) == 1
+    assert first_deltas[0].from_checksum == parent_commit
+    assert first_deltas[0].to_checksum == child_commit
+    # the delta computed for the first repository is added to the second one as it is
+    assert [delta.pulp_href for delta in second_deltas] == [first_deltas[0].pulp_href]
+
+
+@pytest.mark.parallel
+def test_import_commits_missing_parent(
+    pulpcore_bindings,
+    gen_object_with_cleanup,
+    monitor_task,
+    ostree_repository_factory,
+    ostree_repositories_api_client,
+    tmp_path,
+):
+    """Import child commits whose parent is neither stored in Pulp nor present in the tarball."""
+    os.chdir(tmp_path)
+    repo_name = "repo"
+    sample_dir = tmp_path / str(uuid.uuid4())
+    branch_name = "foo"
+
+    # 1. create a parent commit that is never imported to Pulp
+    sample_dir.mkdir()
+    (sample_dir / str(uuid.uuid4())).touch()
+    subprocess.run(["ostree", f"--repo={repo_name}", "init", "--mode=archive"])
+    subprocess.run(
+        ["ostree", f"--repo={repo_name}", "commit", f"--branch={branch_name}", f"{sample_dir}/"]
+    )
+    with open(f"{repo_name}/refs/heads/{branch_name}", "r") as ref:
+        parent_commit = ref.read().strip()
+    shutil.rmtree(repo_name)
+
+    # 2. create two child commits in a repository without the parent commit
+    subprocess.run(["ostree", f"--repo={repo_name}", "init", "--mode=archive"])
+    for _ in range(2):
+        (sample_dir / str(uuid.uuid4())).touch()
+        subprocess.run(
+            [
+                "ostree",
+                f"--repo={repo_name}",
+                "commit",
+                f"--branch={branch_name}",
+                f"{sample_dir}/",
+                f"--parent={parent_commit}",
+            ]
+        )
+        with open(f"{repo_name}/refs/heads/{branch_name}", "r") as ref:
+            parent_commit = ref.read().strip()
+    subprocess.run(["tar", "-cvf", f"{repo_name}.tar", f"{repo_name}/"])
+
+    # 3. import the child commits and check that the task fails instead of hanging
+    artifact = gen_object_with_cleanup(pulpcore_bindings.ArtifactsApi, f"{repo_name}.tar")
+    repo = ostree_repository_factory()
+    add_data = OstreeImportCommitsToRef(
+        artifact=artifact.pulp_href, repository_name=repo_name, ref=branch_name
+    )
+    response = ostree_repositories_api_client.import_commits(repo.pulp_href, add_data)
+    with pytest.raises(PulpTaskError) as exc:
+        monitor_task(response.task)
+    assert "could not be loaded" in exc.value.task.error["description"]
+
+
+@pytest.mark.parallel
+def test_import_commits_delta_retention(
+    pulpcore_bindings,
+    gen_object_with_cleanup,
+    monitor_task,
+    ostree_content_deltas_api_client,
+    ostree_repository_factory,
+    ostree_repositories_api_client,
+    ostree_repositories_versions_api_client,
+    tmp_path,
+):
+    """Import two child commits and check that only deltas to the current head are retained."""
+    os.chdir(tmp_path)
+    repo_name = "repo"
+    sample_dir = tmp_path / str(uuid.uuid4())
+    branch_name = "foo"
+
+    # 1. initialize a local OSTree repository, commit a file, and import the repository
+    sample_dir.mkdir()
+    (sample_dir / str(uuid.uuid4())).touch()
+    subprocess.run(["ostree", f"--repo={repo_name}", "init", "--mode=archive"])
+    subprocess.run(
+        ["ostree", f"--repo={repo_name}", "commit", f"--branch={branch_name}", f"{sample_dir}/"]
+    )
+    subprocess.run(["tar", "-cvf", f"{repo_name}.tar", f"{repo_name}/"])
+
+    artifact = gen_object_with_cleanup(pulpcore_bindings.ArtifactsApi, f"{repo_name}.tar")
+    repo = ostree_repository_factory(name=repo_name, delta_retention=1)
+    commit_data = OstreeImportAll(artifact=artifact.pulp_href, repository_name=repo_name)
+    response = ostree_repositories_api_client.import_all(repo.pulp_href, commit_data)
+    monitor_task(response.task)
+
+    # 2. import two child commits one by one
+    commits = []
+    for _ in range(2):
+        with open(f"{repo_name}/refs/heads/{branch_name}", "r") as ref:
+            parent_commit = ref.read().strip()
+        (sample_dir / str(uuid.uuid4())).touch()
+        subprocess.run(
+            [
+                "ostree",
+                f"--repo={repo_name}",
+                "commit",
+                f"--branch={branch_name}",
+                f"{sample_dir}/",
+                f"--parent={parent_commit}",
+            ]
+        )
+        with open(f"{repo_name}/refs/heads/{branch_name}", "r") as ref:
+            commits.append((parent_commit, ref.read().strip()))
+        subprocess.run(["tar", "-cvf", f"{repo_name}.tar", f"{repo_name}/"])
+
+        artifact = gen_object_with_cleanup(pulpcore_bindings.ArtifactsApi, f"{repo_name}.tar")
+        add_data = OstreeImportCommitsToRef(
+            artifact=artifact.pulp_href, repository_name=repo_name, ref=branch_name
+        )
+        response = ostree_repositories_api_client.import_commits(repo.pulp_href, add_data)
+        repo_version = monitor_task(response.task).created_resources[0]
+
+    # 3. check that the delta to the previous head was removed together with its delta index
+    repository_version = ostree_repositories_versions_api_client.read(repo_version)
+    assert repository_version.content_summary.added["ostree.delta"]["count"] == 1
+    assert repository_version.content_summary.removed["ostree.delta"]["count"] == 1
+    assert repository_version.content_summary.added["ostree.content"]["count"] == 1
+    assert repository_version.content_summary.removed["ostree.content"]["count"] == 1
+    assert repository_version.content_summary.present["ostree.content"]["count"] == 1
+
+    deltas = ostree_content_deltas_api_client.list(repository_version=repo_version).results
+    assert len(deltas) == 1
+    assert (deltas[0].from_checksum, deltas[0].to_checksum) == commits[-1]
+
 
 @pytest.mark.parallel
 def test_import_all_as_ostree_repo_admin(
@@ -411,3 +637,182 @@ def test_import_all_as_ostree_repo_admin(
     added_content = repository_version.content_summary.added
     assert added_content["ostree.refs"]["count"] == 1
     assert added_content["ostree.commit"]["count"] == 1
+
+
+@pytest.mark.parallel
+def test_import_trusted_checksums(
+    pulpcore_bindings,
+    gen_object_with_cleanup,
+    monitor_task,
+    ostree_repository_factory,
+    ostree_repositories_api_client,
+    ostree_repositories_versions_api_client,
+    tmp_path,
+):
+    """Import the same repository twice while trusting checksums, then import a corrupted one."""
+    os.chdir(tmp_path)
+    repo_name = str(uuid.uuid4())
+    sample_dir = tmp_path / str(uuid.uuid4())
+    sample_file = sample_dir / str(uuid.uuid4())
+
+    # 1. initialize a local OSTree repository, commit a file, and create a tarball
+    sample_dir.mkdir()
+    sample_file.write_bytes(os.urandom(1024))
+    subprocess.run(["ostree", f"--repo={repo_name}", "init", "--mode=archive"])
+    subprocess.run(["ostree", f"--repo={repo_name}", "commit", "--branch=foo", f"{sample_dir}/"])
+    subprocess.run(["tar", "-cvf", f"{repo_name}.tar", f"{repo_name}/"])
+    artifact = gen_object_with_cleanup(pulpcore_bindings.ArtifactsApi, f"{repo_name}.tar")
+
+    # 2. import the tarball twice; the objects are known to Pulp during the second import
+    for _ in range(2):
+        repo = ostree_repository_factory()
+        import_data = OstreeImportAll(
+            artifact=artifact.pulp_href, repository_name=repo_name, trust_checksums=True
+        )
+        response = ostree_repositories_api_client.import_all(repo.pulp_href, import_data)
+        repo_version = monitor_task(response.task).created_resources[0]
+
+        added_content = ostree_repositories_versions_api_client.read(
+            repo_version
+        ).content_summary.added
+        assert added_content["ostree.refs"]["count"] == 1
+        assert added_content["ostree.commit"]["count"] == 1
+        assert added_content["ostree.object"]["count"] == 3
+
+    # 3. corrupt the committed file in the local repository and import it once again
+    filez_path = next(
+        os.path.join(dirpath, filename)
+        for dirpath, _, filenames in os.walk(os.path.join(repo_name, "objects"))
+        for filename in filenames
+        if filename.endswith(".filez")
+    )
+    with open(filez_path, "wb") as filez:
+        filez.write(os.urandom(1024))
+    subprocess.run(["tar", "-cvf", f"{repo_name}-corrupted.tar", f"{repo_name}/"])
+    artifact = gen_object_with_cleanup(pulpcore_bindings.ArtifactsApi, f"{repo_name}-corrupted.tar")
+
+    repo = ostree_repository_factory()
+    import_data = OstreeImportAll(
+        artifact=artifact.pulp_href, repository_name=repo_name, trust_checksums=True
+    )
+    response = ostree_repositories_api_client.import_all(repo.pulp_href, import_data)
+    with pytest.raises(PulpTaskError) as exc:
+        monitor_task(response.task)
+    assert "does not match its checksum" in exc.value.task.error["description"]
+
+
+def test_import_from_chunked_upload(
+    pulpcore_bindings,
+    monitor_task,
+    ostree_repository_factory,
+    ostree_repositories_api_client,
+    ostree_repositories_versions_api_client,
+    tmp_path,
+):
+    """Import a repository from a tarball uploaded in multiple chunks."""
+    os.chdir(tmp_path)
+    repo_name = "repo"
+    sample_dir = tmp_path / str(uuid.uuid4())
+    sample_file = sample_dir / str(uuid.uuid4())
+
+    # 1. initialize a local OSTree repository, commit a file, and create a tarball
+    sample_dir.mkdir()
+    sample_file.write_bytes(os.urandom(1024 * 1024))
+    subprocess.run(["ostree", f"--repo={repo_name}", "init", "--mode=archive"])
+    subprocess.run(["ostree", f"--repo={repo_name}", "commit", "--branch=foo", f"{sample_dir}/"])
+    subprocess.run(["tar", "-cvf", f"{repo_name}.tar", f"{repo_name}/"])
+
+    # 2. upload the tarball in three chunks
+    tarball_size = os.path.getsize(f"{repo_name}.tar")
+    chunk_size = tarball_size // 3 + 1
+    upload = pulpcore_bindings.UploadsApi.create({"size": tarball_size})
+    with open(f"{repo_name}.tar", "rb") as tarball:
+        offset = 0
+        while chunk := tarball.read(chunk_size):
+            chunk_file = tmp_path / f"chunk-{offset}"
+            chunk_file.write_bytes(chunk)
+            content_range = f"bytes {offset}-{offset + len(chunk) - 1}/{tarball_size}"
+            pulpcore_bindings.UploadsApi.update(content_range, upload.pulp_href, str(chunk_file))
+            offset += len(chunk)
+
+    # 3. import the upload and check that every chunk was reported
+    repo = ostree_repository_factory()
+    import_data = OstreeImportAll(upload=upload.pulp_href, repository_name=repo_name)
+    response = ostree_repositories_api_client.import_all(repo.pulp_href, import_data)
+    task = monitor_task(response.task)
+
+    progress_report = next(
+        report for report in task.progress_reports if report.code == "reading.tarball"
+    )
+    assert progress_report.total == progress_report.done == 3
+
+    repository_version = ostree_repositories_versions_api_client.read(task.created_resources[0])
+    added_content = repository_version.content_summary.added
+    assert added_content["ostree.refs"]["count"] == 1
+    assert added_content["ostree.commit"]["count"] == 1
+
+    # 4. check that an upload missing some of its chunks is rejected
+    upload = pulpcore_bindings.UploadsApi.create({"size": tarball_size})
+    content_range = f"bytes 0-{chunk_size - 1}/{tarball_size}"
+    pulpcore_bindings.UploadsApi.update(content_range, upload.pulp_href, str(tmp_path / "chunk-0"))
+
+    import_data = OstreeImportAll(upload=upload.pulp_href, repository_name=repo_name)
+    with pytest.raises(ApiException) as exc:
+        ostree_repositories_api_client.import_all(repo.pulp_href, import_data)
+    assert exc.value.status == 400
+    pulpcore_bindings.UploadsApi.delete(upload.pulp_href)
+
+
+def test_import_while_uploading_chunks(
+    pulpcore_bindings,
+    monitor_task,
+    ostree_repository_factory,
+    ostree_repositories_api_client,
+    ostree_repositories_versions_api_client,
+    tmp_path,
+):
+    """Start importing an upload before its chunks are uploaded and upload them in reverse order."""
+    os.chdir(tmp_path)
+    repo_name = "repo"
+    sample_dir = tmp_path / str(uuid.uuid4())
+    sample_file = sample_dir / str(uuid.uuid4())
+
+    # 1. initialize a local OSTree repository, commit a file, and create a tarball
+    sample_dir.mkdir()
+    sample_file.write_bytes(os.urandom(1024 * 1024))
+    subprocess.run(["ostree", f"--repo={repo_name}", "init", "--mode=archive"])
+    subprocess.run(["ostree", f"--repo={repo_name}", "commit", "--branch=foo", f"{sample_dir}/"])
+    subprocess.run(["tar", "-cvf", f"{repo_name}.tar", f"{repo_name}/"])
+
+    # 2. create an empty upload and start importing it right away
+    tarball_size = os.path.getsize(f"{repo_name}.tar")
+    upload = pulpcore_bindings.UploadsApi.create({"size": tarball_size})
+    repo = ostree_repository_factory()
+    import_data = OstreeImportAll(
+        upload=upload.pulp_href, repository_name=repo_name, wait_for_chunks=True
+    )
+    response = ostree_repositories_api_client.import_all(repo.pulp_href, import_data)
+
+    # 3. upload the tarball in three chunks, the first one last, while the task is waiting
+    chunk_size = tarball_size // 3 + 1
+    with open(f"{repo_name}.tar", "rb") as tarball:
+        chunks = []
+        while chunk := tarball.read(chunk_size):
+            chunks.append((sum(len(c) for _, c in chunks), chunk))
+    for offset, chunk in reversed(chunks):
+        chunk_file = tmp_path / f"chunk-{offset}"
+        chunk_file.write_bytes(chunk)
+        content_range = f"bytes {offset}-{offset + len(chunk) - 1}/{tarball_size}"
+        pulpcore_bindings.UploadsApi.update(content_range, upload.pulp_href, str(chunk_file))
+
+    # 4. check that the content was imported and every chunk was reported
+    task = monitor_task(response.task)
+    progress_report = next(
+        report for report in task.progress_reports if report.code == "reading.tarball"
+    )
+    assert progress_report.total == progress_report.done == 3
+
+    repository_version = ostree_repositories_versions_api_client.read(task.created_resources[0])
+    added_content = repository_version.content_summary.added
+    assert added_content["ostree.refs"]["count"] == 1
+    assert added_content["ostree.commit"]["count"] == 1
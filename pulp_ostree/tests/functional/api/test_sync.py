@@ -101,3 +101,99 @@ def test_exclude_all_refs_sync(ostree_remote_factory, ostree_repository_factory,
         added_content["ostree.commit"]
     with pytest.raises(KeyError):
         added_content["ostree.object"]
+
+
+@pytest.mark.parallel
+def test_skip_unchanged_sync(
+    ostree_repositories_api_client, ostree_repository_factory, sync_repo_version, monitor_task
+):
+    """Synchronize content twice and check that the second sync does not create a new version."""
+    repo = ostree_repository_factory()
+    repo_version, remote, repo = sync_repo_version(repo=repo)
+    assert repo.latest_version_href == repo_version.pulp_href
+
+    response = ostree_repositories_api_client.sync(repo.pulp_href, {"remote": remote.pulp_href})
+    task = monitor_task(response.task)
+    assert task.created_resources == []
+
+    repo = ostree_repositories_api_client.read(repo.pulp_href)
+    assert repo.latest_version_href == repo_version.pulp_href
+
+
+@pytest.mark.parallel
+def test_changed_include_refs_sync(
+    ostree_content_refs_api_client,
+    ostree_remotes_api_client,
+    ostree_remote_factory,
+    ostree_repository_factory,
+    sync_repo_version,
+    monitor_task,
+):
+    """Synchronize content twice with different refs and check that the second sync is full."""
+    repo = ostree_repository_factory()
+    remote = ostree_remote_factory(depth=0, include_refs=["rawhide"])
+    repo_version, remote, repo = sync_repo_version(repo=repo, remote=remote)
+    assert repo_version.content_summary.added["ostree.refs"]["count"] == 1
+
+    response = ostree_remotes_api_client.partial_update(remote.pulp_href, {"include_refs": None})
+    monitor_task(response.task)
+
+    new_repo_version, _, repo = sync_repo_version(repo=repo, remote=remote)
+    assert new_repo_version.pulp_href != repo_version.pulp_href
+    assert new_repo_version.number == repo_version.number + 1
+
+    refs = ostree_content_refs_api_client.list(
+        repository_version_added=new_repo_version.pulp_href
+    ).results
+    assert len(refs) == 1
+    assert refs[0].name == "stable"
+
+
+@pytest.mark.parallel
+def test_incremental_mirror_sync(
+    ostree_repositories_api_client,
+    ostree_repositories_versions_api_client,
+    ostree_remotes_api_client,
+    ostree_remote_factory,
+    ostree_repository_factory,
+    monitor_task,
+):
+    """Mirror content twice and check that unchanged refs keep their commits and static deltas."""
+    repo = ostree_repository_factory(compute_delta_from_scratch=True)
+    remote = ostree_remote_factory(depth=0)
+
+    def _mirror():
+        response = ostree_repositories_api_client.sync(
+            repo.pulp_href, {"remote": remote.pulp_href, "mirror": True}
+        )
+        monitor_task(response.task)
+        latest_version_href = ostree_repositories_api_client.read(
+            repo.pulp_href
+        ).latest_version_href
+        return ostree_repositories_versions_api_client.read(latest_version_href)
+
+    repo_version = _mirror()
+    present_content = repo_version.content_summary.present
+    assert present_content["ostree.refs"]["count"] == 2
+    assert present_content["ostree.commit"]["count"] == 2
+    assert present_content["ostree.delta"]["count"] == 2
+    assert present_content["ostree.content"]["count"] == 2
+
+    # a changed option prevents the sync from being skipped while the remote content stays the same
+    response = ostree_remotes_api_client.partial_update(
+        remote.pulp_href, {"exclude_refs": ["non-existing-ref"]}
+    )
+    monitor_task(response.task)
+
+    new_repo_version = _mirror()
+    new_present_content = new_repo_version.content_summary.present
+    for content_type in (
+        "ostree.refs",
+        "ostree.commit",
+        "ostree.object",
+        "ostree.delta",
+        "ostree.content",
+    ):
+        assert (
+            new_present_content[content_type]["count"] == present_content[content_type]["count"]
+        ), content_type
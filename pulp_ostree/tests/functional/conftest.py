@@ -6,6 +6,7 @@ from pulpcore.client.pulp_ostree import (
     ApiClient,
     ContentCommitsApi,
     ContentConfigsApi,
+    ContentDeltasApi,
     ContentObjectsApi,
     ContentRefsApi,
     ContentSummariesApi,
@@ -53,6 +54,12 @@ def ostree_content_objects_api_client(ostree_client):
     return ContentObjectsApi(ostree_client)
 
 
+@pytest.fixture(scope="session")
+def ostree_content_deltas_api_client(ostree_client):
+    """Fixture that returns an instance of ContentDeltasApi"""
+    return ContentDeltasApi(ostree_client)
+
+
 @pytest.fixture(scope="session")
 def ostree_content_summaries_api_client(ostree_client):
     """Fixture that returns an instance of ContentSummariesApi"""
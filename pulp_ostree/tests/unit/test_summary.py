@@ -0,0 +1,107 @@
+import hashlib
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from unittest import TestCase, skipIf
+
+import gi
+
+from pulp_ostree.app.tasks.utils import build_summary, get_commit_metadata
+from pulp_ostree.app.utils import get_static_delta_path
+
+gi.require_version("OSTree", "1.0")
+from gi.repository import Gio, GLib, OSTree  # noqa: E402
+
+SUMMARY_TYPE = "(a(s(taya{sv}))a{sv})"
+
+
+@skipIf(shutil.which("ostree") is None, "The ostree utility is not installed.")
+class TestBuildSummary(TestCase):
+    """Test that summaries built from the database match the ones generated by libostree."""
+
+    def setUp(self):
+        tmp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp_dir.cleanup)
+        self.repo_path = os.path.join(tmp_dir.name, "repo")
+        self.tree_path = os.path.join(tmp_dir.name, "tree")
+        os.mkdir(self.tree_path)
+
+        self.ostree("init", "--mode=archive")
+        self.commit("foo", "1", "--add-metadata-string=version=1.0")
+        self.commit("foo", "2", "--add-metadata-string=version=2.0")
+        self.commit("bar", "3")
+        self.ostree("static-delta", "generate", "foo")
+        self.ostree("static-delta", "generate", "--empty", "bar")
+        self.ostree("summary", "--update")
+
+        self.repo = OSTree.Repo.new(Gio.File.new_for_path(self.repo_path))
+        self.repo.open()
+
+    def ostree(self, *args):
+        return subprocess.check_output(["ostree", f"--repo={self.repo_path}", *args], text=True)
+
+    def commit(self, branch, content, *args):
+        with open(os.path.join(self.tree_path, "file"), "w") as f:
+            f.write(content)
+        self.ostree("commit", f"--branch={branch}", *args, self.tree_path)
+
+    def get_refs(self):
+        refs = []
+        _, all_refs = self.repo.list_refs(None, None)
+        for name, checksum in all_refs.items():
+            _, commit, _ = self.repo.load_commit(checksum)
+            size = commit.get_size()
+            metadata = get_commit_metadata(commit)
+            refs.append((name, checksum, size, metadata["timestamp"], metadata["version"]))
+        return refs
+
+    def get_static_deltas(self):
+        static_deltas = []
+        _, delta_names = self.repo.list_static_delta_names()
+        for delta_name in delta_names:
+            from_, _, to = delta_name.rpartition("-")
+            from_ = from_ or None
+            superblock_path = os.path.join(
+                self.repo_path, get_static_delta_path(from_, to), "superblock"
+            )
+            with open(superblock_path, "rb") as f:
+                digest = hashlib.sha256(f.read()).hexdigest()
+            static_deltas.append((from_, to, digest))
+        return static_deltas
+
+    @staticmethod
+    def load_summary(data):
+        variant = GLib.Variant.new_from_bytes(
+            GLib.VariantType.new(SUMMARY_TYPE), GLib.Bytes.new(data), False
+        )
+        refs, metadata = variant.unpack()
+        last_modified = metadata.pop("ostree.summary.last-modified")
+        return refs, metadata, last_modified
+
+    def test_summary_matches_libostree(self):
+        """Test that the refs, commit metadata, and static deltas are listed like libostree does."""
+        refs = self.get_refs()
+        static_deltas = self.get_static_deltas()
+        self.assertEqual(len(refs), 2)
+        self.assertEqual(len(static_deltas), 2)
+        self.assertIn("2.0", [ref[4] for ref in refs])
+        self.assertIn(None, [ref[4] for ref in refs])
+
+        with open(os.path.join(self.repo_path, "summary"), "rb") as f:
+            expected_refs, expected_metadata, expected_last_modified = self.load_summary(f.read())
+        built_refs, built_metadata, built_last_modified = self.load_summary(
+            build_summary(refs, static_deltas)
+        )
+
+        self.assertEqual(built_refs, expected_refs)
+        self.assertLessEqual(set(built_metadata), set(expected_metadata))
+        for key, value in built_metadata.items():
+            self.assertEqual(value, expected_metadata[key], key)
+
+        # the last modification time is stored in the big-endian byte order too
+        for last_modified in (built_last_modified, expected_last_modified):
+            timestamp = int.from_bytes(last_modified.to_bytes(8, sys.byteorder), "big")
+            self.assertLess(abs(timestamp - time.time()), 3600)
@@ -0,0 +1,256 @@
+import asyncio
+from collections import Counter
+from types import SimpleNamespace
+from unittest import TestCase
+from unittest.mock import Mock, patch
+
+from pulp_ostree.app.models import OstreeObjectType
+from pulp_ostree.app.tasks.stages import DeclarativeContentCreatorMixin
+from pulp_ostree.app.tasks.utils import iter_changed_objects, iter_tree_objects
+
+DIR_META = OstreeObjectType.OSTREE_OBJECT_TYPE_DIR_META
+DIR_TREE = OstreeObjectType.OSTREE_OBJECT_TYPE_DIR_TREE
+FILE = OstreeObjectType.OSTREE_OBJECT_TYPE_FILE
+
+
+class FakeRepo:
+    """A repository holding dirtree objects built from nested dictionaries.
+
+    A directory is a dictionary mapping names to file checksums (strings) or subdirectories
+    (dictionaries); the dirmeta checksum of a directory is stored under the "." key.
+    """
+
+    def __init__(self):
+        self.dirtrees = {}
+        self.loaded = Counter()
+
+    def add_tree(self, directory):
+        """Store a directory with its subdirectories and return its dirtree and dirmeta."""
+        files = {}
+        dirs = {}
+        for name, entry in directory.items():
+            if name == ".":
+                continue
+            if isinstance(entry, dict):
+                dirs[name] = self.add_tree(entry)
+            else:
+                files[name] = entry
+        dirtree = "tree-" + repr((sorted(files.items()), sorted(dirs.items())))
+        self.dirtrees[dirtree] = (files, dirs)
+        return dirtree, directory.get(".", "meta")
+
+    def load_dirtree(self, checksum):
+        self.loaded[checksum] += 1
+        files, dirs = self.dirtrees[checksum]
+        return dict(files), dict(dirs)
+
+    def count_objects(self, tree):
+        """Count occurrences of objects within a tree by walking every path."""
+        dirtree, dirmeta = tree
+        objects = Counter({(dirmeta, DIR_META): 1, (dirtree, DIR_TREE): 1})
+        files, dirs = self.dirtrees[dirtree]
+        objects.update((file_checksum, FILE) for file_checksum in files.values())
+        for subtree in dirs.values():
+            objects.update(self.count_objects(subtree))
+        return objects
+
+
+SHARED = {".": "meta-shared", "a": "file-a", "b": "file-b"}
+
+OLD_TREE = {
+    ".": "meta-root",
+    "README": "file-readme",
+    "etc": {".": "meta-etc", "os-release": "file-os-release-1"},
+    "usr": {
+        "bin": {"sh": "file-sh", "ls": "file-ls"},
+        "lib": {"libc": "file-libc", "nested": {"shared": SHARED}},
+        "share": {"doc": SHARED},
+    },
+    "var": {"log": {"empty": {}}},
+    "opt": "file-opt",
+}
+
+
+class FakeRepoTestCase(TestCase):
+    """A test case loading dirtree objects from a fake repository instead of libostree."""
+
+    def setUp(self):
+        self.repo = FakeRepo()
+        patcher = patch(
+            "pulp_ostree.app.tasks.utils.load_dirtree",
+            lambda _repo, checksum: self.repo.load_dirtree(checksum),
+        )
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+
+class TestTreeWalk(FakeRepoTestCase):
+    """Test walking trees and comparing them."""
+
+    def walk(self, tree):
+        objects = Counter()
+        for obj_checksum, obj_type, count in iter_tree_objects(self.repo, *tree):
+            objects[obj_checksum, obj_type] += count
+        return objects
+
+    def apply_changes(self, old_tree, new_tree):
+        objects = self.repo.count_objects(old_tree)
+        for obj_checksum, obj_type, difference in iter_changed_objects(
+            self.repo, old_tree, new_tree
+        ):
+            objects[obj_checksum, obj_type] += difference
+        return +objects
+
+    def assert_changes(self, old_directory, new_directory):
+        old_tree = self.repo.add_tree(old_directory)
+        new_tree = self.repo.add_tree(new_directory)
+        self.assertEqual(self.apply_changes(old_tree, new_tree), self.repo.count_objects(new_tree))
+        self.assertEqual(self.apply_changes(new_tree, old_tree), self.repo.count_objects(old_tree))
+
+    def test_walk_counts_all_occurrences(self):
+        """Test that objects are counted for each of their occurrences in the tree."""
+        tree = self.repo.add_tree(OLD_TREE)
+        objects = self.walk(tree)
+
+        self.assertEqual(objects, self.repo.count_objects(tree))
+        self.assertEqual(objects["file-a", FILE], 2)
+        self.assertEqual(objects["meta-shared", DIR_META], 2)
+        self.assertEqual(objects["meta", DIR_META], 8)
+
+    def test_walk_loads_repeated_subtrees_once(self):
+        """Test that a repeated subtree is not walked again for each of its occurrences."""
+        shared = {"x": SHARED, "y": SHARED, "z": {"deep": SHARED}}
+        directory = {"one": shared, "two": shared, "three": {"four": shared}}
+        tree = self.repo.add_tree(directory)
+        objects = self.walk(tree)
+
+        self.assertEqual(objects, self.repo.count_objects(tree))
+        self.assertEqual(objects["file-a", FILE], 9)
+        # every distinct dirtree is walked once, the repeated ones are reloaded once more
+        shared_dirtree, _ = self.repo.add_tree(SHARED)
+        self.assertEqual(self.repo.loaded[tree[0]], 1)
+        self.assertEqual(self.repo.loaded[shared_dirtree], 2)
+        self.assertLessEqual(max(self.repo.loaded.values()), 2)
+
+    def test_unchanged_tree(self):
+        """Test that no objects are yielded for identical trees."""
+        tree = self.repo.add_tree(OLD_TREE)
+        self.assertEqual(list(iter_changed_objects(self.repo, tree, tree)), [])
+        self.assertEqual(self.repo.loaded, Counter())
+
+    def test_changed_file(self):
+        """Test that a changed file replaces the old one in all parent directories."""
+        new_directory = {**OLD_TREE, "etc": {".": "meta-etc", "os-release": "file-os-release-2"}}
+        self.assert_changes(OLD_TREE, new_directory)
+
+    def test_changed_dirmeta_only(self):
+        """Test that a dirmeta change does not descend into an unchanged dirtree."""
+        new_directory = {**OLD_TREE, "etc": {**OLD_TREE["etc"], ".": "meta-etc-2"}}
+        old_tree = self.repo.add_tree(OLD_TREE)
+        new_tree = self.repo.add_tree(new_directory)
+        self.repo.loaded.clear()
+
+        changes = list(iter_changed_objects(self.repo, old_tree, new_tree))
+
+        self.assertIn(("meta-etc", DIR_META, -1), changes)
+        self.assertIn(("meta-etc-2", DIR_META, 1), changes)
+        self.assertNotIn(self.repo.add_tree(OLD_TREE["etc"])[0], self.repo.loaded)
+        self.assert_changes(OLD_TREE, new_directory)
+
+    def test_file_replaced_by_directory(self):
+        """Test that a file and a directory of the same name are compared as different entries."""
+        new_directory = {**OLD_TREE, "opt": {"app": "file-opt"}}
+        self.assert_changes(OLD_TREE, new_directory)
+
+    def test_subtree_removed_and_added(self):
+        """Test that whole subtrees are yielded when directories are removed or added."""
+        new_directory = {key: value for key, value in OLD_TREE.items() if key != "var"}
+        new_directory["srv"] = {"www": {"index": "file-index", "copy": SHARED}}
+        self.assert_changes(OLD_TREE, new_directory)
+
+    def test_same_subtree_under_two_names(self):
+        """Test that changes of a subtree are counted for each name it occurs under."""
+        shared = {**SHARED, "b": "file-b-2"}
+        new_directory = {
+            **OLD_TREE,
+            "usr": {
+                **OLD_TREE["usr"],
+                "lib": {"libc": "file-libc", "nested": {"shared": shared}},
+                "share": {"doc": shared},
+            },
+        }
+        self.assert_changes(OLD_TREE, new_directory)
+
+        # the subtree is removed from one of its locations only
+        new_directory = {**OLD_TREE, "usr": {**OLD_TREE["usr"], "share": {}}}
+        self.assert_changes(OLD_TREE, new_directory)
+
+
+class RelatedObjectsCreator(DeclarativeContentCreatorMixin):
+    """A stage stub recording submitted objects and commit relations."""
+
+    def __init__(self, repo, commit_trees):
+        self.repo = repo
+        self.commit_trees = commit_trees
+        self.submitted = []
+        self.commit_relations = Mock()
+
+    async def submit_object(self, obj_checksum, obj_type):
+        self.submitted.append((obj_checksum, obj_type))
+
+
+class TestSubmitRelatedObjects(FakeRepoTestCase):
+    """Test the bookkeeping of objects related to a chain of commits."""
+
+    def submit_commits(self, *directories):
+        commit_trees = {
+            f"commit-{i}": self.repo.add_tree(directory) for i, directory in enumerate(directories)
+        }
+        creator = RelatedObjectsCreator(self.repo, commit_trees)
+
+        async def submit():
+            related = []
+            parent_dc = parent_objects = None
+            for checksum in commit_trees:
+                commit = SimpleNamespace(checksum=checksum)
+                commit_dc = SimpleNamespace(content=commit)
+                commit_dc.resolution = Mock(side_effect=lambda c=commit: asyncio.sleep(0, c))
+                creator.commit_relations.reset_mock()
+                parent_objects = await creator.submit_related_objects(
+                    commit_dc, parent_dc, parent_objects
+                )
+                relations = [call.args for call in creator.commit_relations.add.call_args_list]
+                related.append((Counter(parent_objects), relations))
+                parent_dc = commit_dc
+            return related
+
+        with patch(
+            "pulp_ostree.app.tasks.stages.get_commit_tree",
+            lambda _repo, checksum: commit_trees[checksum],
+        ):
+            return creator, commit_trees, asyncio.run(submit())
+
+    def test_related_objects_of_commits(self):
+        """Test that every commit is related to exactly the objects of its tree."""
+        shared = {**SHARED, "b": "file-b-2"}
+        directories = [
+            OLD_TREE,
+            {**OLD_TREE, "opt": {"app": "file-opt"}},
+            {**OLD_TREE, "usr": {**OLD_TREE["usr"], "share": {"doc": shared}}},
+            {key: value for key, value in OLD_TREE.items() if key not in ("var", "usr")},
+            OLD_TREE,
+        ]
+        creator, commit_trees, related = self.submit_commits(*directories)
+
+        all_objects = set()
+        for (objects, relations), (checksum, tree) in zip(related, commit_trees.items()):
+            expected = self.repo.count_objects(tree)
+            all_objects.update(expected)
+            self.assertEqual(objects, expected)
+            self.assertTrue(all(count > 0 for count in objects.values()))
+            commit = relations[0][0]
+            self.assertEqual(commit.checksum, checksum)
+            self.assertEqual(sorted(key for _, key in relations), sorted(expected))
+
+        # every object of every commit is submitted
+        self.assertEqual(set(creator.submitted), all_objects)